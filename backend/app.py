@@ -3,12 +3,18 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import Config
-from models import db, User, Category
+from models import db
+from migrations import upgrade_database
+from commands import register_commands
+from storage import UploadRequest
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     
+    # Write uploaded files straight into UPLOAD_FOLDER while parsing
+    app.request_class = UploadRequest
+    
     # Initialize extensions
     db.init_app(app)
     jwt = JWTManager(app)
@@ -24,30 +30,24 @@ def create_app():
     from routes.users import users_bp
     from routes.categories import categories_bp
     from routes.documents import documents_bp
+    from routes.uploads import uploads_bp
     
     app.register_blueprint(users_bp, url_prefix='/api/auth')
     app.register_blueprint(categories_bp, url_prefix='/api')
     app.register_blueprint(documents_bp, url_prefix='/api')
+    app.register_blueprint(uploads_bp, url_prefix='/api')
+    
+    register_commands(app)
+    
+    # Invalidations by job worker processes can't reach a per-process cache
+    if Config.CACHE_BACKEND != 'redis' and Config.JOB_THREADS <= 0:
+        app.logger.warning('JOB_THREADS is 0 but CACHE_BACKEND is not redis; '
+                           'listings will not reflect job results until cache entries expire')
     
-    # Create tables and default data
+    # Create tables, apply pending migrations and default data
     with app.app_context():
-        db.create_all()
-        
-        # Create default categories if they don't exist
-        default_categories = [
-            {'name': 'General', 'description': 'General documents', 'color': '#6b7280'},
-            {'name': 'Important', 'description': 'Important documents', 'color': '#ef4444'},
-            {'name': 'Work', 'description': 'Work related documents', 'color': '#3b82f6'},
-            {'name': 'Personal', 'description': 'Personal documents', 'color': '#10b981'},
-            {'name': 'Archive', 'description': 'Archived documents', 'color': '#f59e0b'},
-        ]
-        
-        for cat_data in default_categories:
-            if not Category.query.filter_by(name=cat_data['name']).first():
-                category = Category(**cat_data)
-                db.session.add(category)
-        
-        db.session.commit()
+        if Config.AUTO_MIGRATE:
+            upgrade_database()
     
     # Error handlers
     @app.errorhandler(400)
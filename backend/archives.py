@@ -0,0 +1,66 @@
+import posixpath
+import zipfile
+from config import Config
+from auth import validate_filename
+from storage import copy_upload
+from filetypes import validate_content
+
+class ArchiveError(ValueError):
+    """Raised when an uploaded archive cannot be imported at all"""
+
+def _is_skipped(info):
+    # Directories and the metadata files archivers add are not documents
+    parts = info.filename.split('/')
+    return info.is_dir() or parts[0] == '__MACOSX' or parts[-1].startswith('.')
+
+def open_archive(stream):
+    """Open an uploaded ZIP and list the members to import.
+    
+    Only the central directory is read here. The member count and the
+    total uncompressed size are checked against MAX_ARCHIVE_FILES and
+    MAX_ARCHIVE_SIZE before anything is decompressed.
+    """
+    try:
+        archive = zipfile.ZipFile(stream)
+    except (zipfile.BadZipFile, OSError):
+        raise ArchiveError('File is not a valid ZIP archive')
+    
+    members = [info for info in archive.infolist() if not _is_skipped(info)]
+    if len(members) > Config.MAX_ARCHIVE_FILES:
+        raise ArchiveError(f'Archive contains more than {Config.MAX_ARCHIVE_FILES} files')
+    if sum(info.file_size for info in members) > Config.MAX_ARCHIVE_SIZE:
+        raise ArchiveError('Archive is too large when extracted')
+    
+    return archive, members
+
+def member_directories(info):
+    """Names of the directories a member is stored under, outermost first"""
+    return [part for part in posixpath.dirname(info.filename).split('/') if part.strip()]
+
+def extract_member(archive, info):
+    """Stream one member into a StoredUpload.
+    
+    The member is decompressed straight into UPLOAD_FOLDER and hashed as
+    it is written. Raises ValueError for members that are not accepted.
+    """
+    filename = posixpath.basename(info.filename)
+    is_valid, message = validate_filename(filename)
+    if not is_valid:
+        raise ValueError(message)
+    
+    if info.flag_bits & 0x1:
+        raise ValueError('Encrypted files are not supported')
+    if info.file_size > Config.MAX_CONTENT_LENGTH:
+        raise ValueError('File too large')
+    
+    try:
+        with archive.open(info) as member:
+            upload = copy_upload(member, filename)
+    except (zipfile.BadZipFile, NotImplementedError, EOFError):
+        raise ValueError('File is corrupt or uses an unsupported compression method')
+    
+    is_valid, message = validate_content(upload, filename)
+    if not is_valid:
+        upload.discard()
+        raise ValueError(message)
+    return upload
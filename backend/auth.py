@@ -28,15 +28,22 @@ def get_current_user():
 
 def validate_file(file):
     """Validate uploaded file"""
+    if not file or file.filename == '':
+        return False, "No file selected"
+    
+    return validate_filename(file.filename)
+
+def validate_filename(filename):
+    """Validate the name of a file to be uploaded"""
     from config import Config
     
-    if not file or file.filename == '':
+    if not filename:
         return False, "No file selected"
     
-    if '.' not in file.filename:
+    if '.' not in filename:
         return False, "File must have an extension"
     
-    extension = file.filename.rsplit('.', 1)[1].lower()
+    extension = filename.rsplit('.', 1)[1].lower()
     if extension not in Config.ALLOWED_EXTENSIONS:
         return False, f"File type not allowed. Allowed types: {', '.join(Config.ALLOWED_EXTENSIONS)}"
     
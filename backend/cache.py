@@ -0,0 +1,213 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response, current_app
+from config import Config
+from auth import get_current_user
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a TTL per entry.
+    
+    Only safe for a single worker process: invalidations made by one
+    gunicorn worker are not seen by the others until entries expire.
+    Counters start from zero in every process, so they are paired with
+    a random epoch that differs between processes and restarts.
+    """
+    
+    def __init__(self, max_entries=Config.RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._epoch = uuid.uuid4().hex
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def get_generations(self, names):
+        """Return (epoch, counters) for the named generation counters"""
+        with self._lock:
+            return self._epoch, [self._counters.get(name, 0) for name in names]
+    
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+class RedisCacheBackend:
+    """Cache shared by every worker process, stored in Redis"""
+    
+    def __init__(self, url, prefix='dms:'):
+        import redis
+        
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+    
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+    
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+    
+    def get_generations(self, names):
+        """Return (epoch, counters) for the named generation counters.
+        
+        The epoch is a random token stored next to the counters; if Redis
+        loses them (restart without persistence, eviction, FLUSHDB) a new
+        epoch is created, so restarted counters never repeat old ETags.
+        """
+        epoch, *values = self.client.mget([self.prefix + 'epoch'] + [self.prefix + name for name in names])
+        if epoch is None:
+            self.client.set(self.prefix + 'epoch', uuid.uuid4().hex, nx=True)
+            epoch = self.client.get(self.prefix + 'epoch')
+        return epoch.decode(), [int(value) if value is not None else 0 for value in values]
+    
+    def incr(self, name):
+        return self.client.incr(self.prefix + name)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_cache():
+    """Return the configured cache backend (CACHE_BACKEND = memory | redis)"""
+    global _backend
+    
+    with _backend_lock:
+        if _backend is None:
+            if Config.CACHE_BACKEND == 'redis':
+                _backend = RedisCacheBackend(Config.CACHE_REDIS_URL)
+            else:
+                _backend = MemoryCacheBackend()
+    return _backend
+
+def generation_names(current_user):
+    """Generation counters whose data a user's document responses depend on.
+    
+    Users only see their own documents, admins see everyone's; both see
+    categories (and their document counts) embedded in the payloads.
+    """
+    if current_user.role == 'admin':
+        return ['gen:documents', 'gen:categories', 'gen:users']
+    return [f'gen:user:{current_user.id}', 'gen:categories']
+
+def invalidate_documents(user_ids, categories=False):
+    """Bump generations after documents owned by ``user_ids`` changed.
+    
+    Call after the commit: a response cached under an older generation is
+    simply never looked up again. Pass ``categories`` when category
+    document counters changed too.
+    """
+    cache = get_cache()
+    for user_id in set(user_ids):
+        cache.incr(f'gen:user:{user_id}')
+    cache.incr('gen:documents')
+    if categories:
+        cache.incr('gen:categories')
+
+def invalidate_categories():
+    """Bump the category generation after a category changed"""
+    get_cache().incr('gen:categories')
+
+def invalidate_users():
+    """Bump the user generation after users were added or removed"""
+    get_cache().incr('gen:users')
+
+def category_generation_names(current_user):
+    """Generation counters for category data, identical for every user"""
+    return ['gen:categories']
+
+def _normalized_args():
+    return sorted((name, sorted(request.args.getlist(name))) for name in request.args)
+
+def _response_key(current_user, names):
+    epoch, counters = get_cache().get_generations(names)
+    return json.dumps([
+        'response', request.path, current_user.id, current_user.role,
+        epoch, counters, _normalized_args()
+    ], separators=(',', ':'))
+
+def conditional_response(generations=generation_names):
+    """Answer If-None-Match with 304 when the caller's data hasn't changed.
+    
+    The weak ETag is derived from the request and the generation counters
+    returned by ``generations(current_user)``, so the check runs before
+    any query or serialization in the view. The backend's epoch is part
+    of it too: counters that restarted from zero never match an old ETag. Must be applied inside
+    @jwt_required().
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            current_user = get_current_user()
+            if not current_user:
+                return f(*args, **kwargs)
+            
+            key = _response_key(current_user, generations(current_user))
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+            
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag, weak=True)
+            # Let clients keep the body but always revalidate it
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+def cached_response(f):
+    """Cache a JSON GET endpoint per user and normalized query arguments.
+    
+    The key includes the generation counters from generation_names(), so
+    writes invalidate entries by bumping a counter instead of hunting for
+    keys. Must be applied inside @jwt_required().
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        current_user = get_current_user()
+        if not current_user or not current_app.config.get('RESPONSE_CACHE_ENABLED', True):
+            return f(*args, **kwargs)
+        
+        cache = get_cache()
+        key = _response_key(current_user, generation_names(current_user))
+        
+        cached = cache.get(key)
+        if cached is not None:
+            response = make_response(cached['body'], cached['status'])
+            response.mimetype = cached['mimetype']
+            return response
+        
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            cache.set(key, {
+                'body': response.get_data(as_text=True),
+                'status': response.status_code,
+                'mimetype': response.mimetype
+            }, Config.RESPONSE_CACHE_TTL)
+        return response
+    return decorated_function
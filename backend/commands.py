@@ -0,0 +1,78 @@
+import click
+from config import Config
+from counters import recompute_document_counters
+from migrations import upgrade_database, applied_versions, MIGRATIONS
+from models import db, Document, DocumentContent
+from search import install_search_index, install_content_index, install_trigram_index
+from extraction import extract_document_text
+from storage import recompute_blob_references, purge_expired_uploads
+from jobs import run_workers
+
+def register_commands(app):
+    """Register the admin CLI commands (run with `flask --app app <command>`)"""
+    
+    @app.cli.command('repair-counters')
+    def repair_counters():
+        """Recompute document counters and blob reference counts from scratch"""
+        recompute_document_counters()
+        recompute_blob_references()
+        click.echo('Document counters and blob references recomputed')
+    
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """Apply pending schema migrations to the configured database"""
+        upgrade_database(echo=click.echo)
+        click.echo('Database is up to date')
+    
+    @app.cli.command('db-status')
+    def db_status():
+        """List schema migrations and whether they have been applied"""
+        applied = applied_versions(db.engine)
+        for version, description, _ in MIGRATIONS:
+            status = 'applied' if version in applied else 'pending'
+            click.echo(f'{version:>4}  {status:<8} {description}')
+    
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Create or rebuild the full-text search index"""
+        if all([
+            install_search_index(db.engine),
+            install_content_index(db.engine),
+            install_trigram_index(db.engine)
+        ]):
+            click.echo('Search index rebuilt')
+        else:
+            click.echo('Full-text search is not supported by this database; using ILIKE search')
+    
+    @app.cli.command('extract-text')
+    @click.option('--all', 'reextract', is_flag=True, help='Re-extract documents that already have text')
+    def extract_text_command(reextract):
+        """Extract file contents for documents missing from the content index"""
+        query = db.session.query(Document.id)
+        if not reextract:
+            query = query.outerjoin(DocumentContent).filter(DocumentContent.document_id.is_(None))
+        
+        document_ids = [document_id for document_id, in query.order_by(Document.id)]
+        failed = 0
+        for document_id in document_ids:
+            try:
+                extract_document_text(document_id)
+            except Exception:
+                failed += 1
+        
+        click.echo(f'Extracted text for {len(document_ids) - failed} documents, {failed} failed')
+    
+    @app.cli.command('purge-uploads')
+    def purge_uploads():
+        """Delete resumable upload sessions that have expired"""
+        click.echo(f'Purged {purge_expired_uploads()} expired upload sessions')
+    
+    @app.cli.command('run-workers')
+    @click.option('--processes', type=int, default=Config.JOB_WORKER_PROCESSES, show_default=True,
+                  help='Number of worker processes')
+    def run_workers_command(processes):
+        """Run queued background jobs until interrupted"""
+        # Jobs invalidate cached listings; the web processes must see that
+        if Config.CACHE_BACKEND != 'redis':
+            raise click.UsageError('run-workers needs CACHE_BACKEND=redis; the memory cache is per process')
+        run_workers(processes, echo=click.echo)
\ No newline at end of file
@@ -6,6 +6,29 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///documents.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Apply pending schema migrations on startup; disable to run
+    # `flask --app app db-upgrade` as a separate deployment step
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', '1') != '0'
+    
+    # Typo-tolerant title search (?fuzzy=1); on PostgreSQL the threshold
+    # applies to pg_trgm's word_similarity
+    FUZZY_SEARCH_THRESHOLD = 0.35  # share of the search's trigrams that must match
+    FUZZY_SEARCH_CANDIDATES = 200  # best trigram matches scored per search
+    
+    # Cached totals for ?count=estimate on document listings
+    COUNT_CACHE_TTL = 60  # seconds
+    COUNT_CACHE_SIZE = 1024
+    
+    # Response cache and ETag generations for document listings. 'memory'
+    # is per process: invalidations never reach other processes, so any
+    # deployment with several gunicorn workers or `run-workers` processes
+    # must use 'redis' (with CACHE_REDIS_URL)
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') != '0'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    RESPONSE_CACHE_TTL = 300  # seconds
+    RESPONSE_CACHE_SIZE = 2048  # entries per process (memory backend)
+    
     # JWT configuration - use SECRET_KEY for JWT
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     JWT_SECRET_KEY = SECRET_KEY
@@ -15,8 +38,44 @@ class Config:
     UPLOAD_FOLDER = 'backend/uploads'
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB max file size
     ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'png', 'jpg', 'jpeg', 'gif', 'xlsx', 'xls', 'ppt', 'pptx'}
+    MAX_BATCH_UPLOAD_FILES = 50  # files per /documents/batch-upload request
+    
+    # Content type detection (libmagic via python-magic)
+    MIME_SNIFF_BYTES = 8192  # leading bytes examined per file
+    BLOCKED_MIME_TYPES = {
+        'application/x-dosexec', 'application/x-executable', 'application/x-sharedlib',
+        'application/x-mach-binary', 'application/x-pie-executable'
+    }
+    
+    # ZIP imports (/documents/import-archive); the archive itself is
+    # limited by MAX_CONTENT_LENGTH, each member by it as well
+    MAX_ARCHIVE_FILES = 1000
+    MAX_ARCHIVE_SIZE = 500 * 1024 * 1024  # total uncompressed size
+    
+    # Resumable chunked uploads (/api/uploads); files are still limited
+    # to MAX_CONTENT_LENGTH, each chunk is a request of its own
+    UPLOAD_SESSION_TTL = timedelta(hours=24)  # idle sessions are purged after this
+    UPLOAD_COMPLETION_TIMEOUT = timedelta(minutes=10)  # a completion older than this was abandoned
+    
+    # Background text extraction for content search
+    MAX_EXTRACTED_TEXT_LENGTH = 1000000  # characters kept per document
+    
+    # Post-upload jobs are queued in the jobs table. JOB_THREADS run them
+    # inside every app process; set it to 0 when they are left to
+    # `flask --app app run-workers` (JOB_WORKER_PROCESSES processes)
+    JOB_THREADS = int(os.environ.get('JOB_THREADS', 2))
+    JOB_WORKER_PROCESSES = int(os.environ.get('JOB_WORKER_PROCESSES', 2))
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_DELAY = 30  # seconds before the first retry, doubled after each failure
+    JOB_TIMEOUT = timedelta(minutes=30)  # running jobs older than this were abandoned
+    JOB_POLL_INTERVAL = 2  # seconds an idle worker waits between checks
+    
+    # Image thumbnails: longest edge in pixels per size name
+    THUMBNAIL_SIZES = {'small': 128, 'medium': 256, 'large': 512}
+    THUMBNAIL_QUALITY = 85  # JPEG quality
+    THUMBNAIL_MAX_AGE = 365 * 24 * 3600  # seconds; thumbnails never change
     
     # CORS settings
     CORS_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000", "https://localhost:3000"]
-    CORS_ALLOW_HEADERS = ["Content-Type", "Authorization"]
+    CORS_ALLOW_HEADERS = ["Content-Type", "Authorization", "X-Chunk-SHA256"]
     CORS_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
\ No newline at end of file
@@ -0,0 +1,38 @@
+from models import Document, Category, User, db
+
+def adjust_document_counters(count_delta, bytes_delta, user_id=None, category_id=None):
+    """Apply a document count/size delta to the owner and category counters.
+
+    The increments run as UPDATE ... SET col = col + delta inside the
+    caller's transaction, so they commit or roll back together with the
+    document change and stay exact under concurrent requests.
+    """
+    values = {'documents_count': count_delta, 'total_bytes': bytes_delta}
+    
+    if user_id:
+        User.query.filter_by(id=user_id).update({
+            getattr(User, column): getattr(User, column) + delta
+            for column, delta in values.items()
+        }, synchronize_session=False)
+    
+    if category_id:
+        Category.query.filter_by(id=category_id).update({
+            getattr(Category, column): getattr(Category, column) + delta
+            for column, delta in values.items()
+        }, synchronize_session=False)
+
+def recompute_document_counters():
+    """Recompute every user and category counter from the documents table"""
+    for model, foreign_key in ((User, Document.user_id), (Category, Document.category_id)):
+        count_query = db.select(db.func.count(Document.id)).where(
+            foreign_key == model.id
+        ).scalar_subquery()
+        bytes_query = db.select(db.func.coalesce(db.func.sum(Document.file_size), 0)).where(
+            foreign_key == model.id
+        ).scalar_subquery()
+        
+        db.session.execute(
+            db.update(model).values(documents_count=count_query, total_bytes=bytes_query)
+        )
+    
+    db.session.commit()
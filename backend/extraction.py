@@ -0,0 +1,136 @@
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from config import Config
+from models import Document, DocumentContent, db
+from jobs import job_handler
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF extraction is optional
+    PdfReader = None
+
+# XML namespaces holding the visible text of Office Open XML files
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DRAWING_NS = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+class _TextCollector:
+    """Accumulate extracted text up to the configured maximum length"""
+    
+    def __init__(self, limit):
+        self.limit = limit
+        self.parts = []
+        self.length = 0
+    
+    @property
+    def full(self):
+        return self.length >= self.limit
+    
+    def add(self, text):
+        if text and not self.full:
+            text = text[:self.limit - self.length]
+            self.parts.append(text)
+            self.length += len(text)
+    
+    def text(self):
+        return re.sub(r'[ \t]+', ' ', ' '.join(self.parts)).strip()
+
+def _collect_xml_text(stream, tags, collector):
+    # iterparse keeps memory flat for very large parts
+    for _, element in ET.iterparse(stream):
+        if element.tag in tags:
+            collector.add(element.text)
+        element.clear()
+        if collector.full:
+            break
+
+def _extract_ooxml(path, part_pattern, tags, collector):
+    with zipfile.ZipFile(path) as archive:
+        names = sorted(
+            (name for name in archive.namelist() if re.fullmatch(part_pattern, name)),
+            key=lambda name: [int(n) if n.isdigit() else n for n in re.split(r'(\d+)', name)]
+        )
+        for name in names:
+            with archive.open(name) as stream:
+                _collect_xml_text(stream, tags, collector)
+            if collector.full:
+                break
+
+def _extract_txt(path, collector):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        while not collector.full:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                break
+            collector.add(chunk)
+
+def _extract_pdf(path, collector):
+    reader = PdfReader(path)
+    for page in reader.pages:
+        collector.add(page.extract_text())
+        if collector.full:
+            break
+
+def extract_text(path, file_type):
+    """Extract the plain text of a stored file.
+    
+    Returns None for file types without an extractor (images, legacy
+    binary Office formats, or PDF when pypdf is not installed).
+    """
+    collector = _TextCollector(Config.MAX_EXTRACTED_TEXT_LENGTH)
+    
+    if file_type == 'txt':
+        _extract_txt(path, collector)
+    elif file_type == 'docx':
+        _extract_ooxml(path, r'word/(document|header\d*|footer\d*)\.xml', {WORD_NS + 't'}, collector)
+    elif file_type == 'pptx':
+        _extract_ooxml(path, r'ppt/slides/slide\d+\.xml', {DRAWING_NS + 't'}, collector)
+    elif file_type == 'xlsx':
+        _extract_ooxml(path, r'xl/(sharedStrings|worksheets/sheet\d+)\.xml', {SHEET_NS + 't'}, collector)
+    elif file_type == 'pdf' and PdfReader is not None:
+        _extract_pdf(path, collector)
+    else:
+        return None
+    
+    return collector.text()
+
+def extract_document_text(document_id):
+    """Extract a document's file contents into the content search index.
+    
+    A failed extraction is recorded before the error is re-raised, so the
+    job running it is retried.
+    """
+    document = Document.query.get(document_id)
+    if not document:
+        return
+    
+    record = DocumentContent.query.get(document_id) or DocumentContent(document_id=document_id)
+    error = None
+    
+    try:
+        text = extract_text(document.filepath, document.file_type)
+        record.content = text
+        record.status = 'done' if text is not None else 'unsupported'
+    except Exception as e:
+        record.content = None
+        record.status = 'failed'
+        error = e
+    
+    record.extracted_at = datetime.utcnow()
+    
+    try:
+        db.session.add(record)
+        db.session.commit()
+    except Exception:
+        # The document was deleted while its text was being extracted
+        db.session.rollback()
+        return
+    
+    if error is not None:
+        raise error
+
+@job_handler('extract_text')
+def extract_text_job(job):
+    extract_document_text(job.document_id)
@@ -0,0 +1,81 @@
+from sqlalchemy import literal, cast, union_all
+from models import Document, Category, DocumentTag, db
+
+FACETS = ('category', 'file_type', 'tag')
+
+# Only the most common tags are returned
+TAG_FACET_LIMIT = 50
+
+def parse_facets(value):
+    """Parse ?facets=category,file_type,tag; raises ValueError for unknown names"""
+    requested = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in FACETS]
+    if unknown:
+        raise ValueError(f"Unknown facets: {', '.join(unknown)}")
+    return [name for name in FACETS if name in requested]
+
+def facet_counts(query, facets):
+    """Count the documents matched by ``query`` per category, file type and tag.
+    
+    The matching set is computed once as a CTE and every requested facet
+    is a GROUP BY over it, combined with UNION ALL into a single query.
+    Visibility rules are whatever ``query`` already applies.
+    """
+    if not facets:
+        return {}
+    
+    matched = query.order_by(None).with_entities(
+        Document.id, Document.category_id, Document.file_type
+    ).cte('matched_documents')
+    count = db.func.count().label('count')
+    parts = []
+    
+    if 'category' in facets:
+        parts.append(
+            db.select(
+                literal('category').label('facet'),
+                cast(matched.c.category_id, db.String).label('value'),
+                db.func.max(Category.name).label('label'),
+                count
+            ).select_from(matched)
+            .outerjoin(Category, Category.id == matched.c.category_id)
+            .group_by(matched.c.category_id)
+        )
+    
+    if 'file_type' in facets:
+        parts.append(
+            db.select(
+                literal('file_type').label('facet'),
+                matched.c.file_type.label('value'),
+                matched.c.file_type.label('label'),
+                count
+            ).group_by(matched.c.file_type)
+        )
+    
+    if 'tag' in facets:
+        top_tags = db.select(
+            DocumentTag.tag_name.label('value'),
+            count
+        ).join(matched, matched.c.id == DocumentTag.document_id).group_by(
+            DocumentTag.tag_name
+        ).order_by(db.desc('count'), DocumentTag.tag_name).limit(TAG_FACET_LIMIT).subquery()
+        parts.append(
+            db.select(
+                literal('tag').label('facet'),
+                top_tags.c.value,
+                top_tags.c.value.label('label'),
+                top_tags.c.count
+            )
+        )
+    
+    results = {facet: [] for facet in facets}
+    for facet, value, label, total in db.session.execute(union_all(*parts)):
+        if facet == 'category':
+            entry = {'value': int(value) if value is not None else None, 'label': label, 'count': total}
+        else:
+            entry = {'value': value, 'count': total}
+        results[facet].append(entry)
+    
+    for entries in results.values():
+        entries.sort(key=lambda entry: (-entry['count'], str(entry['value'])))
+    return results
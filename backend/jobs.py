@@ -0,0 +1,234 @@
+import os
+import signal
+import socket
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from config import Config
+from models import Document, Job, db
+from cache import invalidate_documents
+
+# Job kinds queued for every new document, run in this order
+POST_UPLOAD_JOBS = ['extract_text', 'thumbnails']
+
+# kind -> function(job) doing the work; registered with @job_handler
+JOB_HANDLERS = {}
+
+# kind -> file types its post-upload jobs are queued for (default: all)
+JOB_FILE_TYPES = {}
+
+# Characters of an error message kept on the job
+MAX_ERROR_LENGTH = 500
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def job_handler(kind, file_types=None):
+    """Register the function that runs jobs of ``kind``.
+    
+    Handlers get the Job and raise to have it retried. They run in an
+    application context, and commit their own changes. With
+    ``file_types`` post-upload jobs are only queued for those documents.
+    """
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        if file_types is not None:
+            JOB_FILE_TYPES[kind] = set(file_types)
+        return f
+    return decorator
+
+def enqueue_document_jobs(documents, kinds=None):
+    """Queue post-upload jobs for new documents inside the caller's transaction.
+    
+    The jobs commit together with the documents, so a crash right after
+    the upload cannot lose them. Call dispatch_jobs() after the commit.
+    """
+    rows = [
+        {'kind': kind, 'document_id': document.id, 'max_attempts': Config.JOB_MAX_ATTEMPTS}
+        for document in documents
+        for kind in (POST_UPLOAD_JOBS if kinds is None else kinds)
+        if kind not in JOB_FILE_TYPES or document.file_type in JOB_FILE_TYPES[kind]
+    ]
+    if rows:
+        db.session.execute(db.insert(Job), rows)
+
+def retry_delay(attempts):
+    """Delay before retrying a job that has failed ``attempts`` times"""
+    return timedelta(seconds=Config.JOB_RETRY_DELAY * 2 ** (attempts - 1))
+
+def error_summary(error):
+    """A job error as stored and shown: exception class and message only"""
+    # OSError messages would include the server-side path
+    message = error.strerror if isinstance(error, OSError) and error.strerror else str(error).strip()
+    summary = f'{type(error).__name__}: {message}' if message else type(error).__name__
+    return summary[:MAX_ERROR_LENGTH]
+
+def _release_stale_jobs(now):
+    # Jobs whose worker died are retried, or failed if out of attempts
+    stale = (Job.status == 'running') & (Job.locked_at < now - Config.JOB_TIMEOUT)
+    Job.query.filter(stale, Job.attempts >= Job.max_attempts).update({
+        Job.status: 'failed', Job.locked_by: None, Job.finished_at: now,
+        Job.last_error: 'Worker stopped while running the job'
+    }, synchronize_session=False)
+    Job.query.filter(stale).update({
+        Job.status: 'queued', Job.locked_by: None, Job.run_after: now
+    }, synchronize_session=False)
+
+def claim_job(worker_id):
+    """Take the oldest runnable job for this worker, or return None.
+    
+    A job is claimed by an UPDATE that only succeeds while it is still
+    queued, so concurrent workers (threads or processes) never run the
+    same job twice.
+    """
+    now = datetime.utcnow()
+    _release_stale_jobs(now)
+    db.session.commit()
+    
+    candidates = db.session.query(Job.id).filter(
+        Job.status == 'queued', Job.run_after <= now
+    ).order_by(Job.run_after, Job.id).limit(10).all()
+    
+    for job_id, in candidates:
+        claimed = Job.query.filter(Job.id == job_id, Job.status == 'queued').update({
+            Job.status: 'running', Job.locked_by: worker_id, Job.locked_at: now,
+            Job.attempts: Job.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+def run_job(job):
+    """Run a claimed job and record the outcome.
+    
+    A failing job is queued again after an exponentially growing delay
+    until it has used max_attempts. Returns the job's new status.
+    """
+    handler = JOB_HANDLERS.get(job.kind)
+    job_id, kind, document_id = job.id, job.kind, job.document_id
+    attempts, max_attempts = job.attempts, job.max_attempts
+    
+    try:
+        if handler is None:
+            raise LookupError(f'No handler for job kind {kind!r}')
+        handler(job)
+        values = {Job.status: 'done', Job.last_error: None, Job.finished_at: datetime.utcnow()}
+    except Exception as e:
+        db.session.rollback()
+        # The traceback stays in the server log; clients see a summary
+        current_app.logger.exception('Job %s (%s) failed on attempt %s', job_id, kind, attempts)
+        if attempts < max_attempts:
+            values = {Job.status: 'queued', Job.run_after: datetime.utcnow() + retry_delay(attempts)}
+        else:
+            values = {Job.status: 'failed', Job.finished_at: datetime.utcnow()}
+        values[Job.last_error] = error_summary(e)
+    
+    values[Job.locked_by] = None
+    # The document (and its jobs) may have been deleted meanwhile
+    Job.query.filter_by(id=job_id).update(values, synchronize_session=False)
+    db.session.commit()
+    
+    if document_id:
+        owner = db.session.query(Document.user_id).filter_by(id=document_id).scalar()
+        if owner:
+            invalidate_documents([owner])
+    
+    return values[Job.status]
+
+def run_next_job(worker_id):
+    """Claim and run one job; returns its new status, or None when idle"""
+    job = claim_job(worker_id)
+    if job is None:
+        return None
+    return run_job(job)
+
+def _drain(app, worker_id):
+    with app.app_context():
+        try:
+            while True:
+                job = claim_job(worker_id)
+                if job is None:
+                    break
+                
+                attempts = job.attempts
+                if run_job(job) == 'queued':
+                    # Come back for the retry once its delay has passed
+                    timer = threading.Timer(retry_delay(attempts).total_seconds(), dispatch_jobs, (app,))
+                    timer.daemon = True
+                    timer.start()
+        finally:
+            db.session.remove()
+
+def dispatch_jobs(app=None):
+    """Run queued jobs on this process's JOB_THREADS background threads.
+    
+    Called after committing new jobs so they start right away, without
+    waiting for a worker's next poll. Does nothing when JOB_THREADS is 0,
+    i.e. when only `flask run-workers` processes run jobs.
+    """
+    global _executor
+    
+    if Config.JOB_THREADS <= 0:
+        return
+    
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.JOB_THREADS, thread_name_prefix='jobs')
+    
+    app = app or current_app._get_current_object()
+    _executor.submit(_drain, app, f'{socket.gethostname()}:{os.getpid()}:threads')
+
+def work(worker_id, stop):
+    """Run jobs until the ``stop`` event is set, polling while idle"""
+    while not stop.is_set():
+        try:
+            if run_next_job(worker_id) is None:
+                stop.wait(Config.JOB_POLL_INTERVAL)
+        except Exception:
+            # e.g. the database is briefly unavailable; keep the worker alive
+            db.session.rollback()
+            traceback.print_exc()
+            stop.wait(Config.JOB_POLL_INTERVAL)
+        finally:
+            db.session.remove()
+
+def _worker_process(number):
+    from app import create_app
+    
+    stop = threading.Event()
+    # Finish the current job, then exit
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    
+    app = create_app()
+    with app.app_context():
+        work(f'{socket.gethostname()}:{os.getpid()}:{number}', stop)
+
+def run_workers(processes, echo=print):
+    """Start ``processes`` worker processes and wait for them.
+    
+    Each process creates its own app and database connections. Ctrl+C or
+    SIGTERM stops them once their current job is done.
+    """
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_worker_process, args=(number,), daemon=False) for number in range(processes)]
+    for worker in workers:
+        worker.start()
+    echo(f'Started {processes} job worker processes')
+    
+    def stop(signum, frame):
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    while any(worker.is_alive() for worker in workers):
+        for worker in workers:
+            worker.join(timeout=1)
+    echo('Job workers stopped')
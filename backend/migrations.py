@@ -0,0 +1,215 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from models import db, Category
+
+MIGRATIONS = []
+
+DEFAULT_CATEGORIES = [
+    {'name': 'General', 'description': 'General documents', 'color': '#6b7280'},
+    {'name': 'Important', 'description': 'Important documents', 'color': '#ef4444'},
+    {'name': 'Work', 'description': 'Work related documents', 'color': '#3b82f6'},
+    {'name': 'Personal', 'description': 'Personal documents', 'color': '#10b981'},
+    {'name': 'Archive', 'description': 'Archived documents', 'color': '#f59e0b'},
+]
+
+def migration(version, description):
+    """Register a schema migration; versions are applied in ascending order.
+    
+    A migration runs against the schema as of its version, while the
+    models describe the latest one. Data migrations therefore select
+    only the columns they need, never whole model instances, and write
+    with UPDATE statements.
+    """
+    def decorator(f):
+        MIGRATIONS.append((version, description, f))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return f
+    return decorator
+
+def _ensure_version_table(engine):
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version INTEGER PRIMARY KEY, '
+            'description VARCHAR(200) NOT NULL, '
+            'applied_at TIMESTAMP NOT NULL)'
+        ))
+
+def applied_versions(engine):
+    """Return the set of migration versions already applied"""
+    _ensure_version_table(engine)
+    with engine.connect() as connection:
+        return {row[0] for row in connection.execute(text('SELECT version FROM schema_migrations'))}
+
+def pending_migrations(engine):
+    """Return the registered migrations not yet applied, in order"""
+    applied = applied_versions(engine)
+    return [item for item in MIGRATIONS if item[0] not in applied]
+
+def upgrade_database(echo=None):
+    """Create missing tables, apply every pending migration and seed default data.
+    
+    Migrations are idempotent so a fresh database (whose tables create_all()
+    has just built with the current schema) and several workers starting at
+    once both end up at the same version.
+    """
+    engine = db.engine
+    db.create_all()
+    
+    for version, description, apply in pending_migrations(engine):
+        if echo:
+            echo(f'Applying migration {version}: {description}')
+        apply(engine)
+        
+        try:
+            with engine.begin() as connection:
+                connection.execute(
+                    text('INSERT INTO schema_migrations (version, description, applied_at) '
+                         'VALUES (:version, :description, :applied_at)'),
+                    {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+                )
+        except IntegrityError:
+            # Another process applied and recorded it concurrently
+            pass
+    
+    seed_default_data()
+
+def seed_default_data():
+    """Create default categories if they don't exist"""
+    for cat_data in DEFAULT_CATEGORIES:
+        if not Category.query.filter_by(name=cat_data['name']).first():
+            category = Category(**cat_data)
+            db.session.add(category)
+    
+    db.session.commit()
+
+def _column_names(engine, table):
+    return {column['name'] for column in inspect(engine).get_columns(table)}
+
+def add_column(engine, table, column, ddl):
+    """Add a column unless it already exists; returns True when added"""
+    if column in _column_names(engine, table):
+        return False
+    
+    with engine.begin() as connection:
+        connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    return True
+
+def create_index(engine, name, table, columns, unique=False, using=None):
+    """Build an index without blocking readers or writers for the whole migration.
+    
+    On PostgreSQL the index is built CONCURRENTLY (outside a transaction),
+    so reads and writes continue while it is created. On SQLite each index
+    gets its own short transaction; with the WAL journal readers are not
+    blocked while it builds.
+    """
+    unique_sql = 'UNIQUE ' if unique else ''
+    using_sql = f' USING {using}' if using else ''
+    
+    if engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text(
+                f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}{using_sql} ({columns})'
+            ))
+    else:
+        with engine.begin() as connection:
+            connection.execute(text(
+                f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table}{using_sql} ({columns})'
+            ))
+
+@migration(1, 'Add document counters to users and categories')
+def add_document_counters(engine):
+    from counters import recompute_document_counters
+    
+    added = False
+    for table in ('users', 'categories'):
+        added |= add_column(engine, table, 'documents_count', 'INTEGER NOT NULL DEFAULT 0')
+        added |= add_column(engine, table, 'total_bytes', 'BIGINT NOT NULL DEFAULT 0')
+    
+    if added:
+        recompute_document_counters()
+
+@migration(2, 'Add indexes for document listing filters and tag lookups')
+def add_document_indexes(engine):
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA journal_mode=WAL')
+    
+    create_index(engine, 'ix_documents_upload_date', 'documents', 'upload_date DESC, id DESC')
+    create_index(engine, 'ix_documents_user_upload_date', 'documents', 'user_id, upload_date DESC, id DESC')
+    create_index(engine, 'ix_documents_category_upload_date', 'documents', 'category_id, upload_date DESC, id DESC')
+    create_index(engine, 'ix_documents_file_type_upload_date', 'documents', 'file_type, upload_date DESC, id DESC')
+    create_index(engine, 'ix_document_tags_document_id', 'document_tags', 'document_id')
+    create_index(engine, 'ix_document_tags_tag_name', 'document_tags', 'tag_name, document_id')
+
+@migration(3, 'Add full-text search index for document titles and descriptions')
+def add_search_index(engine):
+    from search import install_search_index
+    
+    install_search_index(engine)
+
+@migration(4, 'Add full-text search index for extracted file contents')
+def add_content_search_index(engine):
+    from search import install_content_index
+    
+    install_content_index(engine)
+
+@migration(5, 'Normalize tag names and make them unique per document')
+def normalize_document_tags(engine):
+    from tags import normalize_tag
+    
+    with engine.begin() as connection:
+        tag_names = [row[0] for row in connection.execute(text('SELECT DISTINCT tag_name FROM document_tags'))]
+        for tag_name in tag_names:
+            normalized = normalize_tag(tag_name)
+            if normalized != tag_name:
+                connection.execute(
+                    text('UPDATE document_tags SET tag_name = :normalized WHERE tag_name = :tag_name'),
+                    {'normalized': normalized, 'tag_name': tag_name}
+                )
+        
+        # Drop empty names and duplicates left behind by the normalization
+        connection.execute(text("DELETE FROM document_tags WHERE tag_name = ''"))
+        connection.execute(text(
+            'DELETE FROM document_tags WHERE id NOT IN ('
+            'SELECT MIN(id) FROM document_tags GROUP BY document_id, tag_name)'
+        ))
+    
+    create_index(engine, 'uq_document_tags_document_tag', 'document_tags', 'document_id, tag_name', unique=True)
+    
+    # The unique index also serves lookups by document_id
+    with engine.begin() as connection:
+        connection.execute(text('DROP INDEX IF EXISTS ix_document_tags_document_id'))
+
+@migration(6, 'Add indexes for sorting documents by title and file size')
+def add_sort_indexes(engine):
+    create_index(engine, 'ix_documents_title', 'documents', 'title, id')
+    create_index(engine, 'ix_documents_file_size', 'documents', 'file_size, id')
+    create_index(engine, 'ix_documents_user_title', 'documents', 'user_id, title, id')
+    create_index(engine, 'ix_documents_user_file_size', 'documents', 'user_id, file_size, id')
+
+@migration(7, 'Add trigram index for fuzzy title and filename search')
+def add_trigram_index(engine):
+    from search import install_trigram_index
+    
+    install_trigram_index(engine)
+
+@migration(8, 'Add SHA-256 checksums to documents')
+def add_document_checksums(engine):
+    add_column(engine, 'documents', 'sha256', 'VARCHAR(64)')
+
+@migration(9, 'Move stored files into the content-addressed blob store')
+def add_blob_store(engine):
+    from storage import migrate_files_to_blobs
+    
+    create_index(engine, 'ix_documents_sha256', 'documents', 'sha256')
+    migrate_files_to_blobs()
+
+
+@migration(10, 'Add detected MIME types to documents')
+def add_document_mime_types(engine):
+    from filetypes import backfill_mime_types
+    
+    add_column(engine, 'documents', 'mime_type', 'VARCHAR(100)')
+    backfill_mime_types()
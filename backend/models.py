@@ -14,6 +14,10 @@ class User(db.Model):
     role = db.Column(db.String(20), default='user')  # user, admin
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Denormalized counters, maintained by counters.adjust_document_counters()
+    documents_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    
     # Relationships
     documents = db.relationship('Document', backref='owner', lazy='dynamic')
     
@@ -32,7 +36,8 @@ class User(db.Model):
             'email': self.email,
             'role': self.role,
             'created_at': self.created_at.isoformat(),
-            'documents_count': self.documents.count()
+            'documents_count': self.documents_count,
+            'total_bytes': self.total_bytes
         }
 
 class Category(db.Model):
@@ -44,6 +49,10 @@ class Category(db.Model):
     color = db.Column(db.String(7), default='#3b82f6')  # Hex color
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Denormalized counters, maintained by counters.adjust_document_counters()
+    documents_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    
     # Relationships
     documents = db.relationship('Document', backref='category', lazy='dynamic')
     
@@ -54,7 +63,8 @@ class Category(db.Model):
             'description': self.description,
             'color': self.color,
             'created_at': self.created_at.isoformat(),
-            'documents_count': self.documents.count()
+            'documents_count': self.documents_count,
+            'total_bytes': self.total_bytes
         }
 
 class Document(db.Model):
@@ -66,6 +76,8 @@ class Document(db.Model):
     filepath = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)  # in bytes
     file_type = db.Column(db.String(50), nullable=False)
+    sha256 = db.Column(db.String(64))  # hex digest of the stored file
+    mime_type = db.Column(db.String(100))  # detected from the contents
     description = db.Column(db.Text)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -75,6 +87,22 @@ class Document(db.Model):
     
     # Relationships
     tags = db.relationship('DocumentTag', backref='document', lazy='dynamic', cascade='all, delete-orphan')
+    text_content = db.relationship('DocumentContent', backref='document', uselist=False, cascade='all, delete-orphan')
+    jobs = db.relationship('Job', backref='document', lazy='dynamic', cascade='all, delete-orphan')
+    
+    # Indexes matching the listing filters and sort orders
+    # (keep in sync with migrations.py)
+    __table_args__ = (
+        db.Index('ix_documents_upload_date', upload_date.desc(), id.desc()),
+        db.Index('ix_documents_user_upload_date', user_id, upload_date.desc(), id.desc()),
+        db.Index('ix_documents_category_upload_date', category_id, upload_date.desc(), id.desc()),
+        db.Index('ix_documents_file_type_upload_date', file_type, upload_date.desc(), id.desc()),
+        db.Index('ix_documents_title', title, id),
+        db.Index('ix_documents_file_size', file_size, id),
+        db.Index('ix_documents_user_title', user_id, title, id),
+        db.Index('ix_documents_user_file_size', user_id, file_size, id),
+        db.Index('ix_documents_sha256', sha256),
+    )
     
     def get_file_size_formatted(self):
         """Format file size in human readable format"""
@@ -85,22 +113,73 @@ class Document(db.Model):
             size /= 1024.0
         return f"{size:.1f} TB"
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'filename': self.filename,
-            'file_size': self.file_size,
-            'file_size_formatted': self.get_file_size_formatted(),
-            'file_type': self.file_type,
-            'description': self.description,
-            'upload_date': self.upload_date.isoformat(),
-            'user_id': self.user_id,
-            'category_id': self.category_id,
-            'category': self.category.to_dict() if self.category else None,
-            'owner': self.owner.username,
-            'tags': [tag.tag_name for tag in self.tags]
+    # Attributes and relations selectable with ?fields= and ?embed=
+    FIELDS = {
+        'id': lambda doc: doc.id,
+        'title': lambda doc: doc.title,
+        'filename': lambda doc: doc.filename,
+        'file_size': lambda doc: doc.file_size,
+        'file_size_formatted': lambda doc: doc.get_file_size_formatted(),
+        'file_type': lambda doc: doc.file_type,
+        'sha256': lambda doc: doc.sha256,
+        'mime_type': lambda doc: doc.mime_type,
+        'description': lambda doc: doc.description,
+        'upload_date': lambda doc: doc.upload_date.isoformat(),
+        'user_id': lambda doc: doc.user_id,
+        'category_id': lambda doc: doc.category_id,
+    }
+    EMBEDS = ('category', 'owner', 'tags', 'jobs')
+    # Embedded unless ?fields=/?embed= say otherwise; jobs only on request
+    DEFAULT_EMBEDS = ('category', 'owner', 'tags')
+    
+    # Columns each field needs loaded
+    FIELD_COLUMNS = {
+        'file_size_formatted': 'file_size',
+    }
+    
+    def to_dict(self, related=None, fields=None, embed=None):
+        """Serialize the document.
+        
+        ``fields`` limits the attributes and ``embed`` the related objects
+        (category, owner, tags, jobs) included; they default to every
+        attribute and DEFAULT_EMBEDS.
+        ``related`` holds relations bulk-loaded by
+        serializers.load_document_relations(); without it they are
+        lazy-loaded one query at a time.
+        """
+        if embed is None:
+            embed = self.DEFAULT_EMBEDS
+        
+        data = {
+            field: self.FIELDS[field](self)
+            for field in (self.FIELDS if fields is None else fields)
         }
+        
+        if 'category' in embed:
+            if related is None:
+                data['category'] = self.category.to_dict() if self.category else None
+            else:
+                data['category'] = related['categories'].get(self.category_id)
+        
+        if 'owner' in embed:
+            if related is None:
+                data['owner'] = self.owner.username
+            else:
+                data['owner'] = related['owners'].get(self.user_id)
+        
+        if 'tags' in embed:
+            if related is None:
+                data['tags'] = [tag.tag_name for tag in self.tags]
+            else:
+                data['tags'] = related['tags'].get(self.id, [])
+        
+        if 'jobs' in embed:
+            if related is None:
+                data['jobs'] = [job.to_dict() for job in self.jobs.order_by(Job.id)]
+            else:
+                data['jobs'] = related['jobs'].get(self.id, [])
+        
+        return data
 
 class DocumentTag(db.Model):
     __tablename__ = 'document_tags'
@@ -109,9 +188,75 @@ class DocumentTag(db.Model):
     document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
     tag_name = db.Column(db.String(50), nullable=False)
     
+    # Tag names are normalized (see tags.normalize_tag) and unique per
+    # document; the tag_name index is the inverted index used for filtering
+    __table_args__ = (
+        db.Index('uq_document_tags_document_tag', document_id, tag_name, unique=True),
+        db.Index('ix_document_tags_tag_name', tag_name, document_id),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
             'document_id': self.document_id,
             'tag_name': self.tag_name
-        }
\ No newline at end of file
+        }
+
+class DocumentContent(db.Model):
+    __tablename__ = 'document_contents'
+    
+    # Integer primary key so SQLite uses it as the rowid for the FTS5 index
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), primary_key=True, autoincrement=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, done, unsupported, failed
+    content = db.Column(db.Text)
+    extracted_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'document_id': self.document_id,
+            'status': self.status,
+            'extracted_at': self.extracted_at.isoformat() if self.extracted_at else None
+        }
+
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+    
+    # Stored file contents, shared by every document with the same hash
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    # Background work queued in the database; see jobs.py
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'))
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    # Workers poll for the oldest runnable job; documents list their jobs
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', status, run_after),
+        db.Index('ix_jobs_document_id', document_id),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'run_after': self.run_after.isoformat() if self.run_after else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
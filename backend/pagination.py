@@ -0,0 +1,188 @@
+import base64
+import binascii
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import tuple_
+from config import Config
+from models import db
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+# Recently computed counts, keyed by SQL and parameters
+_count_cache = OrderedDict()
+_count_cache_lock = threading.Lock()
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(values, direction, sort=None):
+    """Encode sort key values into an opaque, URL-safe cursor"""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    payload = json.dumps({'v': values, 'd': direction, 's': sort}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, columns, sort=None):
+    """Decode a cursor into (values, direction) typed after the given columns"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = payload['v']
+        direction = payload['d']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise InvalidCursor('Invalid cursor')
+    
+    if payload.get('s') != sort:
+        raise InvalidCursor('Cursor does not match the requested sort order')
+    
+    if direction not in ('next', 'prev') or not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor('Invalid cursor')
+    
+    typed_values = []
+    for column, value in zip(columns, values):
+        try:
+            if column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value is not None:
+                value = column.type.python_type(value)
+        except (ValueError, TypeError, NotImplementedError):
+            raise InvalidCursor('Invalid cursor')
+        typed_values.append(value)
+    
+    return typed_values, direction
+
+def keyset_paginate(query, columns, cursor=None, per_page=10, descending=True, sort=None):
+    """Page through a query on a unique, ordered tuple of columns.
+    
+    Unlike OFFSET pagination the cost of a page does not depend on how deep
+    it is: every page is a range scan starting right after (or before) the
+    key encoded in the cursor. ``sort`` names the ordering; cursors issued
+    for a different one are rejected.
+    
+    Returns (items, pagination_dict).
+    """
+    key = tuple_(*columns)
+    direction = 'next'
+    
+    if cursor:
+        values, direction = decode_cursor(cursor, columns, sort)
+        bound = tuple_(*values)
+        # Rows after the cursor in display order, or before it when paging back
+        if (direction == 'next') == descending:
+            query = query.filter(key < bound)
+        else:
+            query = query.filter(key > bound)
+    
+    # Paging backwards walks the index in reverse and flips the rows afterwards
+    reverse = direction == 'prev'
+    if descending != reverse:
+        query = query.order_by(*[column.desc() for column in columns])
+    else:
+        query = query.order_by(*[column.asc() for column in columns])
+    
+    # Fetch one extra row to know whether another page exists
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if reverse:
+        items.reverse()
+    
+    if reverse:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = bool(cursor), has_more
+    
+    def cursor_for(item, item_direction):
+        return encode_cursor([getattr(item, column.key) for column in columns], item_direction, sort)
+    
+    return items, {
+        'per_page': per_page,
+        'next_cursor': cursor_for(items[-1], 'next') if items and has_next else None,
+        'prev_cursor': cursor_for(items[0], 'prev') if items and has_prev else None,
+        'has_next': has_next and bool(items),
+        'has_prev': has_prev and bool(items)
+    }
+
+def _explain_statement(query, dialect):
+    # Expanding IN lists (tag filters, fuzzy matches) are rendered with one
+    # parameter per value; the driver can't expand their placeholders
+    compiled = query.order_by(None).statement.compile(
+        dialect=dialect, compile_kwargs={'render_postcompile': True}
+    )
+    return f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params
+
+def _planner_row_estimate(query):
+    # PostgreSQL's planner estimate costs no more than planning the query
+    sql, params = _explain_statement(query, db.engine.dialect)
+    plan = db.session.connection().exec_driver_sql(sql, params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+def _cached_count(query):
+    compiled = query.order_by(None).statement.compile(dialect=db.engine.dialect)
+    key = (str(compiled), tuple(sorted((name, repr(value)) for name, value in compiled.params.items())))
+    now = time.monotonic()
+    
+    with _count_cache_lock:
+        entry = _count_cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+    
+    total = query.order_by(None).count()
+    
+    with _count_cache_lock:
+        _count_cache[key] = (now + Config.COUNT_CACHE_TTL, total)
+        _count_cache.move_to_end(key)
+        while len(_count_cache) > Config.COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    
+    return total
+
+def estimate_count(query):
+    """Return an approximate row count for a query.
+    
+    Uses the planner's estimate on PostgreSQL and otherwise an exact
+    count cached for COUNT_CACHE_TTL seconds.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return _planner_row_estimate(query)
+    return _cached_count(query)
+
+def offset_paginate(query, page, per_page, count='exact', estimate=None):
+    """Page through an ordered query with LIMIT/OFFSET.
+    
+    ``count`` selects how the total is obtained: 'exact' runs COUNT(*),
+    'estimate' calls ``estimate(query)`` (estimate_count by default) and
+    'none' skips it. has_next always comes from fetching one extra row.
+    
+    Returns (items, pagination_dict).
+    """
+    page = max(page, 1)
+    items = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    has_next = len(items) > per_page
+    items = items[:per_page]
+    
+    if count == 'exact':
+        total = query.order_by(None).count()
+    elif count == 'estimate':
+        total = (estimate or estimate_count)(query)
+    else:
+        total = None
+    
+    if total is not None:
+        # An estimate must not contradict the rows actually seen
+        total = max(total, (page - 1) * per_page + len(items) + (1 if has_next else 0))
+    
+    return items, {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': math.ceil(total / per_page) if total is not None else None,
+        'has_next': has_next,
+        'has_prev': page > 1,
+        'count': count
+    }
@@ -2,11 +2,14 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Category, db
 from auth import admin_required, get_current_user
+from cache import invalidate_categories, conditional_response, category_generation_names
+from serializers import serialize_documents, parse_fieldset, document_load_options
 
 categories_bp = Blueprint('categories', __name__)
 
 @categories_bp.route('/categories', methods=['GET'])
 @jwt_required()
+@conditional_response(category_generation_names)
 def get_categories():
     """Get all categories"""
     categories = Category.query.all()
@@ -53,6 +56,7 @@ def create_category():
         
         db.session.add(new_category)
         db.session.commit()
+        invalidate_categories()
         
         return jsonify({
             'message': 'Category created successfully',
@@ -97,6 +101,7 @@ def update_category(category_id):
     
     try:
         db.session.commit()
+        invalidate_categories()
         return jsonify({
             'message': 'Category updated successfully',
             'category': category.to_dict()
@@ -124,6 +129,7 @@ def delete_category(category_id):
     try:
         db.session.delete(category)
         db.session.commit()
+        invalidate_categories()
         
         return jsonify({'message': 'Category deleted successfully'}), 200
         
@@ -140,9 +146,14 @@ def get_category_documents(category_id):
     if not category:
         return jsonify({'error': 'Category not found'}), 404
     
-    documents = category.documents.all()
+    try:
+        fields, embed = parse_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    documents = category.documents.options(*document_load_options(fields, embed)).all()
     
     return jsonify({
         'category': category.to_dict(),
-        'documents': [doc.to_dict() for doc in documents]
+        'documents': serialize_documents(documents, fields=fields, embed=embed)
     }), 200
\ No newline at end of file
@@ -1,30 +1,90 @@
 import os
-import uuid
-from flask import Blueprint, request, jsonify, send_file
+import io
+import csv
+import json
+import itertools
+import posixpath
+from datetime import datetime
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.utils import secure_filename
 from models import Document, Category, DocumentTag, User, db
 from auth import get_current_user, validate_file, secure_filename_custom
 from config import Config
+from pagination import keyset_paginate, offset_paginate, estimate_count, InvalidCursor, COUNT_MODES
+from serializers import serialize_documents, serialize_document, parse_fieldset, document_load_options
+from counters import adjust_document_counters
+from search import apply_search, apply_content_search, apply_fuzzy_search, search_snippets
+from jobs import enqueue_document_jobs, dispatch_jobs
+from thumbnails import has_thumbnails, ensure_thumbnail
+from filetypes import detect_mime_type, upload_head, validate_content
+from storage import store_upload, acquire_blob, abandon_upload, release_document_file
+from archives import ArchiveError, open_archive, member_directories, extract_member
+from tags import parse_tags, parse_tag_filter, apply_tag_filter
+from facets import parse_facets, facet_counts
+from cache import cached_response, conditional_response, invalidate_documents
 
 documents_bp = Blueprint('documents', __name__)
 
-@documents_bp.route('/documents', methods=['GET'])
-@jwt_required()
-def get_documents():
-    """Get all documents with optional filtering"""
-    current_user = get_current_user()
+# Sortable columns and their default direction; each has a supporting index
+SORT_COLUMNS = {
+    'upload_date': (Document.upload_date, 'desc'),
+    'title': (Document.title, 'asc'),
+    'file_size': (Document.file_size, 'desc'),
+}
+
+# Range filters on the listing; with any of them the counters don't apply
+RANGE_FILTERS = ('uploaded_after', 'uploaded_before', 'min_size', 'max_size')
+
+def _parse_datetime(value):
+    """Parse an ISO 8601 date or datetime query parameter"""
+    return datetime.fromisoformat(value.strip())
+
+def _parse_range_filters():
+    """Parse the upload date and file size range parameters.
+    
+    Returns a dict with None for the ones not given; raises ValueError
+    for a malformed value instead of ignoring the filter.
+    """
+    ranges = {}
+    for name in RANGE_FILTERS:
+        value = request.args.get(name, '').strip()
+        if not value:
+            ranges[name] = None
+        elif name.startswith('uploaded_'):
+            try:
+                ranges[name] = _parse_datetime(value)
+            except ValueError:
+                raise ValueError(f'{name} must be an ISO 8601 date or datetime')
+        else:
+            try:
+                ranges[name] = int(value)
+            except ValueError:
+                ranges[name] = -1
+            if ranges[name] < 0:
+                raise ValueError(f'{name} must be a non-negative integer')
+    return ranges
+
+def _filtered_documents_query(current_user, rank_search=False):
+    """Build the document query for the current request's filters.
     
-    # Get query parameters
+    Returns (query, truncated), truncated as from apply_fuzzy_search().
+    Raises ValueError for a malformed range or tag filter.
+    """
     category_id = request.args.get('category_id', type=int)
     search = request.args.get('search', '').strip()
+    fuzzy = request.args.get('fuzzy', '').strip().lower() in ('1', 'true', 'yes')
     user_id = request.args.get('user_id', type=int)
     file_type = request.args.get('file_type', '').strip()
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 10, type=int), 100)
+    content_search = request.args.get('content_search', '').strip()
+    ranges = _parse_range_filters()
+    uploaded_after, uploaded_before = ranges['uploaded_after'], ranges['uploaded_before']
+    min_size, max_size = ranges['min_size'], ranges['max_size']
+    tag_names = parse_tag_filter(request.args.get('tags', ''))
+    match_all_tags = request.args.get('tags_mode', 'all').strip().lower() != 'any'
     
     # Base query
     query = Document.query
+    truncated = False
     
     # Filter by category
     if category_id:
@@ -40,36 +100,296 @@ def get_documents():
     if file_type:
         query = query.filter(Document.file_type == file_type)
     
-    # Search in title and description
-    if search:
-        search_pattern = f"%{search}%"
-        query = query.filter(
-            (Document.title.ilike(search_pattern)) |
-            (Document.description.ilike(search_pattern))
-        )
+    # Filter by upload date range (after is inclusive, before exclusive)
+    if uploaded_after:
+        query = query.filter(Document.upload_date >= uploaded_after)
+    if uploaded_before:
+        query = query.filter(Document.upload_date < uploaded_before)
+    
+    # Filter by file size range in bytes
+    if min_size is not None:
+        query = query.filter(Document.file_size >= min_size)
+    if max_size is not None:
+        query = query.filter(Document.file_size <= max_size)
+    
+    # Filter by tags (all of them by default, any of them with tags_mode=any)
+    if tag_names:
+        query = apply_tag_filter(query, tag_names, match_all=match_all_tags)
+    
+    # Search in title and description, or typo-tolerant in title and filename
+    if search and fuzzy:
+        query, truncated = apply_fuzzy_search(query, search, ranked=rank_search)
+    elif search:
+        query = apply_search(query, search, ranked=rank_search)
+    
+    # Search in extracted file contents
+    if content_search:
+        query = apply_content_search(query, content_search)
+    
+    return query, truncated
+
+def _counter_total(current_user):
+    """Total from the maintained document counters, if the filters allow it"""
+    filters = ('search', 'file_type', 'content_search', 'tags') + RANGE_FILTERS
+    if any(request.args.get(name, '').strip() for name in filters):
+        return None
     
-    # Order by upload date (newest first)
-    query = query.order_by(Document.upload_date.desc())
+    category_id = request.args.get('category_id', type=int)
+    user_id = request.args.get('user_id', type=int)
     
-    # Paginate
-    pagination = query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    if current_user.role != 'admin':
+        return None if category_id else current_user.documents_count
+    
+    if category_id and user_id:
+        return None
+    if category_id:
+        category = Category.query.get(category_id)
+        return category.documents_count if category else 0
+    if user_id:
+        user = User.query.get(user_id)
+        return user.documents_count if user else 0
+    return db.session.query(db.func.sum(User.documents_count)).scalar() or 0
+
+# Most documents one batch fetch may ask for
+MAX_BATCH_IDS = 100
+
+def _parse_document_ids(value):
+    """Parse "1,2,3" or [1, 2, 3] into a list of unique IDs, keeping their order"""
+    if isinstance(value, str):
+        value = [item.strip() for item in value.split(',') if item.strip()]
+    if not isinstance(value, list) or not value:
+        raise ValueError('ids must be a non-empty list of document IDs')
     
-    documents = pagination.items
+    try:
+        ids = [int(item) for item in value if not isinstance(item, (bool, float))]
+    except (ValueError, TypeError):
+        ids = []
+    if len(ids) != len(value):
+        raise ValueError('ids must be a non-empty list of document IDs')
+    
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f'At most {MAX_BATCH_IDS} ids can be fetched at once')
+    return ids
+
+def _documents_by_ids(current_user, document_ids, fields, embed):
+    """Fetch several documents with the same permission checks as get_document.
+    
+    Documents come back in the requested order; IDs that don't exist or
+    belong to another user are listed under errors instead.
+    """
+    found = {
+        document.id: document
+        for document in Document.query.options(
+            *document_load_options(fields, embed)
+        ).filter(Document.id.in_(document_ids)).all()
+    }
+    
+    documents = []
+    errors = []
+    for document_id in document_ids:
+        document = found.get(document_id)
+        if not document:
+            errors.append({'id': document_id, 'error': 'Document not found'})
+        elif current_user.role != 'admin' and document.user_id != current_user.id:
+            errors.append({'id': document_id, 'error': 'Access denied'})
+        else:
+            documents.append(document)
     
     return jsonify({
-        'documents': [doc.to_dict() for doc in documents],
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'has_next': pagination.has_next,
-            'has_prev': pagination.has_prev
-        }
+        'documents': serialize_documents(documents, fields=fields, embed=embed),
+        'errors': errors
     }), 200
 
+@documents_bp.route('/documents', methods=['GET'])
+@jwt_required()
+@conditional_response()
+@cached_response
+def get_documents():
+    """Get all documents with optional filtering"""
+    current_user = get_current_user()
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 10, type=int), 100)
+    
+    try:
+        fields, embed = parse_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # ?ids=1,2,3 fetches exactly those documents instead of a filtered page
+    if 'ids' in request.args:
+        try:
+            document_ids = _parse_document_ids(request.args.get('ids', ''))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return _documents_by_ids(current_user, document_ids, fields, embed)
+    
+    # Highlighted search snippets replace the full description in the payload
+    search = request.args.get('search', '').strip()
+    with_snippets = bool(search) and request.args.get('snippets', '').strip().lower() in ('1', 'true', 'yes')
+    if with_snippets and fields is None:
+        fields = [field for field in Document.FIELDS if field != 'description']
+    
+    # How to compute pagination.total: exact COUNT(*), estimate, or none
+    count_mode = request.args.get('count', 'exact').strip().lower()
+    if count_mode not in COUNT_MODES:
+        return jsonify({'error': f"count must be one of: {', '.join(COUNT_MODES)}"}), 400
+    
+    try:
+        facets = parse_facets(request.args.get('facets', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    sort = request.args.get('sort', 'upload_date').strip()
+    if sort not in SORT_COLUMNS:
+        return jsonify({'error': f"sort must be one of: {', '.join(SORT_COLUMNS)}"}), 400
+    sort_column, default_order = SORT_COLUMNS[sort]
+    
+    order = request.args.get('order', default_order).strip().lower()
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'order must be asc or desc'}), 400
+    descending = order == 'desc'
+    
+    # Keyset pagination: opt in with ?cursor= (empty for the first page)
+    use_cursor = 'cursor' in request.args
+    
+    # Search results are ranked by relevance unless a sort is requested
+    # explicitly or keyset pagination needs its own ordering
+    rank_search = not use_cursor and 'sort' not in request.args
+    try:
+        query, truncated = _filtered_documents_query(current_user, rank_search=rank_search)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = query.options(*document_load_options(fields, embed))
+    
+    # Facet counts over the whole filtered set, not just this page
+    facet_results = facet_counts(query, facets) if facets else None
+    
+    if use_cursor:
+        try:
+            documents, pagination = keyset_paginate(
+                query,
+                [sort_column, Document.id],
+                cursor=request.args.get('cursor', '').strip(),
+                per_page=per_page,
+                descending=descending,
+                sort=f'{sort}:{order}'
+            )
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        # Order by the sort column (newest first by default), after relevance when searching
+        if descending:
+            query = query.order_by(sort_column.desc(), Document.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), Document.id.asc())
+        
+        def estimate_total(query):
+            # Unfiltered user/category listings are covered by the counters
+            total = _counter_total(current_user)
+            return total if total is not None else estimate_count(query)
+        
+        documents, pagination = offset_paginate(
+            query, page, per_page, count=count_mode, estimate=estimate_total
+        )
+    
+    # A fuzzy search only scores its best candidates; say when it stopped short
+    pagination['truncated'] = truncated
+    
+    response = {
+        'documents': serialize_documents(documents, fields=fields, embed=embed),
+        'pagination': pagination
+    }
+    if facet_results is not None:
+        response['facets'] = facet_results
+    
+    if with_snippets:
+        snippets = search_snippets(
+            [document.id for document in documents], search,
+            fuzzy=request.args.get('fuzzy', '').strip().lower() in ('1', 'true', 'yes')
+        )
+        for document, doc in zip(documents, response['documents']):
+            doc['snippets'] = snippets.get(document.id)
+    
+    return jsonify(response), 200
+
+def create_documents(current_user, entries):
+    """Add the Documents for several claimed uploads to the session; the caller commits.
+    
+    Each entry is a dict of create_document()'s keyword arguments. The
+    documents are flushed together, their tags are bulk-inserted and the
+    counters are updated once per category instead of once per file.
+    Post-upload jobs are queued for every document.
+    """
+    documents = []
+    for entry in entries:
+        upload = entry['upload']
+        original_filename = secure_filename_custom(entry['filename'])
+        file_extension = original_filename.rsplit('.', 1)[1].lower()
+        mime_type = detect_mime_type(upload_head(upload), original_filename)
+        
+        # Identical contents are stored once and shared
+        filepath = acquire_blob(upload)
+        
+        documents.append(Document(
+            title=entry['title'],
+            filename=original_filename,
+            filepath=filepath,
+            file_size=upload.size,
+            file_type=file_extension,
+            sha256=upload.sha256,
+            mime_type=mime_type,
+            description=entry.get('description', ''),
+            user_id=current_user.id,
+            category_id=entry.get('category_id')
+        ))
+    
+    db.session.add_all(documents)
+    db.session.flush()  # Get document IDs
+    
+    category_totals = {}
+    for document in documents:
+        count, size = category_totals.get(document.category_id, (0, 0))
+        category_totals[document.category_id] = (count + 1, size + document.file_size)
+    
+    adjust_document_counters(
+        len(documents), sum(document.file_size for document in documents), user_id=current_user.id
+    )
+    for category_id, (count, size) in category_totals.items():
+        adjust_document_counters(count, size, category_id=category_id)
+    
+    # Add tags if provided
+    tag_rows = [
+        {'document_id': document.id, 'tag_name': tag_name}
+        for document, entry in zip(documents, entries)
+        for tag_name in parse_tags(entry.get('tags', ''))
+    ]
+    if tag_rows:
+        db.session.execute(db.insert(DocumentTag), tag_rows)
+    
+    # Text extraction etc. runs in the background, queued in this transaction
+    enqueue_document_jobs(documents)
+    
+    return documents
+
+def create_document(current_user, upload, filename, title, description='', category_id=None, tags=''):
+    """Add the Document for a claimed upload to the session; the caller commits.
+    
+    ``upload`` is anything with the path, size and sha256 of a finished
+    file (a StoredUpload or a completed ChunkedUpload). Its file is moved
+    into the blob store, and the owner and category counters and the tags
+    are written in the same transaction.
+    """
+    return create_documents(current_user, [{
+        'upload': upload,
+        'filename': filename,
+        'title': title,
+        'description': description,
+        'category_id': category_id,
+        'tags': tags
+    }])[0]
+
 @documents_bp.route('/documents/upload', methods=['POST'])
 @jwt_required()
 def upload_document():
@@ -101,62 +421,257 @@ def upload_document():
         if not category:
             return jsonify({'error': 'Invalid category'}), 400
     
+    # The body was streamed to its final path while it was parsed
+    upload = store_upload(file)
+    
+    # The extension is checked above, the contents here
+    is_valid, message = validate_content(upload, file.filename)
+    if not is_valid:
+        upload.discard()
+        return jsonify({'error': message}), 400
+    
     try:
-        # Generate unique filename
-        original_filename = secure_filename_custom(file.filename)
-        file_extension = original_filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-        
-        # Create upload directory if it doesn't exist
-        upload_dir = Config.UPLOAD_FOLDER
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Save file
-        filepath = os.path.join(upload_dir, unique_filename)
-        file.save(filepath)
+        upload.claim()
         
-        # Get file size
-        file_size = os.path.getsize(filepath)
-        
-        # Create document record
-        document = Document(
-            title=title,
-            filename=original_filename,
-            filepath=filepath,
-            file_size=file_size,
-            file_type=file_extension,
-            description=description,
-            user_id=current_user.id,
-            category_id=category_id
+        document = create_document(
+            current_user, upload, file.filename,
+            title=title, description=description, category_id=category_id, tags=tags
         )
         
-        db.session.add(document)
-        db.session.flush()  # Get document ID
-        
-        # Add tags if provided
-        if tags:
-            tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
-            for tag_name in tag_list:
-                if len(tag_name) <= 50:  # Validate tag length
-                    tag = DocumentTag(document_id=document.id, tag_name=tag_name)
-                    db.session.add(tag)
-        
         db.session.commit()
+        invalidate_documents([current_user.id], categories=bool(category_id))
+        
+        # Process the file without making the upload wait
+        dispatch_jobs()
         
         return jsonify({
             'message': 'Document uploaded successfully',
-            'document': document.to_dict()
+            'document': serialize_document(document)
         }), 201
-        
+    
     except Exception as e:
         db.session.rollback()
         # Clean up file if database operation failed
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
+        if 'upload' in locals() and upload.claimed:
+            abandon_upload(upload)
         return jsonify({'error': 'Failed to upload document'}), 500
 
+def _parse_batch_metadata(value, file_count):
+    """Parse the per-file metadata of a batch upload: a JSON list in file order"""
+    if not value:
+        return [{}] * file_count
+    
+    try:
+        metadata = json.loads(value)
+    except ValueError:
+        raise ValueError('metadata must be a JSON list')
+    
+    if not isinstance(metadata, list) or not all(isinstance(item, dict) for item in metadata):
+        raise ValueError('metadata must be a JSON list of objects')
+    if len(metadata) != file_count:
+        raise ValueError('metadata must have one entry per file')
+    
+    for item in metadata:
+        category_id = item.get('category_id')
+        if category_id is not None and (not isinstance(category_id, int) or isinstance(category_id, bool)):
+            raise ValueError('category_id must be an integer')
+    
+    return metadata
+
+def _create_batch(current_user, entries, results, names):
+    """Create the documents of a multi-file upload in one transaction.
+    
+    ``entries`` are (index, create_document() arguments) pairs for the
+    files that were accepted and stored; ``results`` already holds the
+    rejected ones and is filled in for the rest, reporting each file by
+    its entry in ``names``. Returns the response.
+    """
+    try:
+        for _, entry in entries:
+            entry['upload'].claim()
+        
+        documents = create_documents(current_user, [entry for _, entry in entries]) if entries else []
+        
+        if documents:
+            db.session.commit()
+            invalidate_documents(
+                [current_user.id], categories=any(document.category_id for document in documents)
+            )
+    
+    except Exception as e:
+        db.session.rollback()
+        # Clean up files if the database operation failed
+        for _, entry in entries:
+            abandon_upload(entry['upload'])
+        return jsonify({'error': 'Failed to upload documents'}), 500
+    
+    # Process the files without making the upload wait
+    if documents:
+        dispatch_jobs()
+    
+    for (index, entry), doc in zip(entries, serialize_documents(documents)):
+        results[index] = {'filename': names[index], 'status': 'created', 'document': doc}
+    
+    return jsonify({
+        'message': f'{len(documents)} of {len(results)} documents uploaded',
+        'created': len(documents),
+        'failed': len(results) - len(documents),
+        'results': results
+    }), 201 if documents else 400
+
+@documents_bp.route('/documents/batch-upload', methods=['POST'])
+@jwt_required()
+def batch_upload_documents():
+    """Upload several documents in one request and one transaction.
+    
+    Files are sent as repeated ``files`` parts. The description,
+    category_id and tags form fields apply to every file; an optional
+    ``metadata`` JSON list overrides them (and sets the title) per file.
+    Files that fail validation are reported and the rest are stored.
+    """
+    current_user = get_current_user()
+    
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    if len(files) > Config.MAX_BATCH_UPLOAD_FILES:
+        return jsonify({'error': f'At most {Config.MAX_BATCH_UPLOAD_FILES} files can be uploaded at once'}), 400
+    
+    try:
+        metadata = _parse_batch_metadata(request.form.get('metadata'), len(files))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    defaults = {
+        'description': request.form.get('description', '').strip(),
+        'category_id': request.form.get('category_id', type=int),
+        'tags': request.form.get('tags', '').strip()
+    }
+    
+    # Validate every category named in the batch with one query
+    category_ids = {item.get('category_id', defaults['category_id']) for item in metadata} - {None, 0}
+    valid_categories = {
+        category_id for category_id, in
+        db.session.query(Category.id).filter(Category.id.in_(category_ids))
+    } if category_ids else set()
+    
+    results = [None] * len(files)
+    entries = []
+    for index, (file, item) in enumerate(zip(files, metadata)):
+        is_valid, message = validate_file(file)
+        category_id = item.get('category_id', defaults['category_id'])
+        if is_valid and category_id and category_id not in valid_categories:
+            is_valid, message = False, 'Invalid category'
+        
+        if is_valid:
+            # The body was streamed to its final path while it was parsed
+            upload = store_upload(file)
+            is_valid, message = validate_content(upload, file.filename)
+            if not is_valid:
+                upload.discard()
+        
+        if not is_valid:
+            results[index] = {'filename': file.filename, 'status': 'failed', 'error': message}
+            continue
+        
+        entries.append((index, {
+            'upload': upload,
+            'filename': file.filename,
+            'title': str(item.get('title') or '').strip() or file.filename.rsplit('.', 1)[0],
+            'description': str(item.get('description', defaults['description']) or '').strip(),
+            'category_id': category_id or None,
+            'tags': item.get('tags', defaults['tags'])
+        }))
+    
+    return _create_batch(current_user, entries, results, [file.filename for file in files])
+
+@documents_bp.route('/documents/import-archive', methods=['POST'])
+@jwt_required()
+def import_archive():
+    """Create a document for every file in an uploaded ZIP archive.
+    
+    Members are decompressed one at a time straight into storage. The
+    first directory in a member's path named like a category puts it in
+    that category; every other directory name becomes a tag. The
+    category_id, description and tags form fields are the defaults.
+    """
+    current_user = get_current_user()
+    
+    if 'archive' not in request.files:
+        return jsonify({'error': 'No archive provided'}), 400
+    
+    description = request.form.get('description', '').strip()
+    default_category_id = request.form.get('category_id', type=int)
+    default_tags = parse_tags(request.form.get('tags', ''))
+    
+    if default_category_id and not Category.query.get(default_category_id):
+        return jsonify({'error': 'Invalid category'}), 400
+    
+    try:
+        archive, members = open_archive(request.files['archive'].stream)
+    except ArchiveError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Resolve every directory name that matches a category with one query
+    directory_names = {name.lower() for info in members for name in member_directories(info)}
+    categories = {
+        name.lower(): category_id for category_id, name in
+        db.session.query(Category.id, Category.name).filter(db.func.lower(Category.name).in_(directory_names))
+    } if directory_names else {}
+    
+    results = [None] * len(members)
+    entries = []
+    try:
+        with archive:
+            for index, info in enumerate(members):
+                try:
+                    upload = extract_member(archive, info)
+                except ValueError as e:
+                    results[index] = {'filename': info.filename, 'status': 'failed', 'error': str(e)}
+                    continue
+                
+                directories = member_directories(info)
+                category_dir = next((name for name in directories if name.lower() in categories), None)
+                category_id = categories[category_dir.lower()] if category_dir else default_category_id
+                tags = [name for name in directories if name != category_dir] + default_tags
+                filename = posixpath.basename(info.filename)
+                
+                entries.append((index, {
+                    'upload': upload,
+                    'filename': filename,
+                    'title': filename.rsplit('.', 1)[0],
+                    'description': description,
+                    'category_id': category_id,
+                    'tags': tags
+                }))
+    except Exception:
+        for _, entry in entries:
+            entry['upload'].discard()
+        raise
+    
+    # Members are reported by their path in the archive
+    return _create_batch(current_user, entries, results, [info.filename for info in members])
+
+@documents_bp.route('/documents/batch-get', methods=['POST'])
+@jwt_required()
+def batch_get_documents():
+    """Get several documents by ID, for ID lists too long for a query string"""
+    current_user = get_current_user()
+    
+    # Accept {"ids": [...]} or a bare list
+    data = request.get_json(silent=True)
+    
+    try:
+        document_ids = _parse_document_ids(data.get('ids') if isinstance(data, dict) else data)
+        fields, embed = parse_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return _documents_by_ids(current_user, document_ids, fields, embed)
+
 @documents_bp.route('/documents/<int:document_id>', methods=['GET'])
 @jwt_required()
+@conditional_response()
 def get_document(document_id):
     """Get specific document details"""
     current_user = get_current_user()
@@ -170,7 +685,12 @@ def get_document(document_id):
     if current_user.role != 'admin' and document.user_id != current_user.id:
         return jsonify({'error': 'Access denied'}), 403
     
-    return jsonify({'document': document.to_dict()}), 200
+    try:
+        fields, embed = parse_fieldset(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'document': serialize_document(document, fields=fields, embed=embed)}), 200
 
 @documents_bp.route('/documents/<int:document_id>/download', methods=['GET'])
 @jwt_required()
@@ -192,15 +712,67 @@ def download_document(document_id):
         return jsonify({'error': 'File not found on server'}), 404
     
     try:
-        return send_file(
+        response = send_file(
             document.filepath,
             as_attachment=True,
             download_name=document.filename,
-            mimetype='application/octet-stream'
+            mimetype=document.mime_type or 'application/octet-stream'
         )
+        # Browsers must not second-guess the detected type
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
     except Exception as e:
         return jsonify({'error': 'Failed to download file'}), 500
 
+@documents_bp.route('/documents/<int:document_id>/thumbnail', methods=['GET'])
+@jwt_required()
+def get_thumbnail(document_id):
+    """Get a JPEG thumbnail of an image document (?size=small|medium|large).
+    
+    Thumbnails are normally made by a background job after the upload;
+    one that is missing, e.g. for a document uploaded before thumbnails
+    existed, is generated on first request.
+    """
+    current_user = get_current_user()
+    
+    size = request.args.get('size', 'medium')
+    if size not in Config.THUMBNAIL_SIZES:
+        return jsonify({'error': f"size must be one of: {', '.join(Config.THUMBNAIL_SIZES)}"}), 400
+    
+    document = Document.query.get(document_id)
+    
+    if not document:
+        return jsonify({'error': 'Document not found'}), 404
+    
+    # Check permissions
+    if current_user.role != 'admin' and document.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    if not has_thumbnails(document):
+        return jsonify({'error': 'No thumbnail for this file type'}), 404
+    
+    if not os.path.exists(document.filepath):
+        return jsonify({'error': 'File not found on server'}), 404
+    
+    try:
+        path = ensure_thumbnail(document, size)
+    except Exception as e:
+        return jsonify({'error': 'Failed to generate thumbnail'}), 422
+    
+    # A document's file never changes, so neither does its thumbnail
+    response = send_file(
+        path,
+        mimetype='image/jpeg',
+        etag=f'{document.sha256}-{size}',
+        max_age=Config.THUMBNAIL_MAX_AGE,
+        conditional=True
+    )
+    # Only the owner's browser may keep it: the endpoint needs a token
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
 @documents_bp.route('/documents/<int:document_id>', methods=['PUT'])
 @jwt_required()
 def update_document(document_id):
@@ -221,6 +793,8 @@ def update_document(document_id):
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
+    category_changed = False
+    
     try:
         # Update fields if provided
         if 'title' in data and data['title'].strip():
@@ -235,6 +809,12 @@ def update_document(document_id):
                 category = Category.query.get(category_id)
                 if not category:
                     return jsonify({'error': 'Invalid category'}), 400
+            
+            # Move the document's count and size to the new category
+            if category_id != document.category_id:
+                adjust_document_counters(-1, -document.file_size, category_id=document.category_id)
+                adjust_document_counters(1, document.file_size, category_id=category_id)
+                category_changed = True
             document.category_id = category_id
         
         # Update tags
@@ -243,26 +823,18 @@ def update_document(document_id):
             DocumentTag.query.filter_by(document_id=document.id).delete()
             
             # Add new tags
-            tags = data['tags']
-            if isinstance(tags, str):
-                tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
-            elif isinstance(tags, list):
-                tag_list = [str(tag).strip() for tag in tags if str(tag).strip()]
-            else:
-                tag_list = []
-            
-            for tag_name in tag_list:
-                if len(tag_name) <= 50:
-                    tag = DocumentTag(document_id=document.id, tag_name=tag_name)
-                    db.session.add(tag)
+            for tag_name in parse_tags(data['tags']):
+                tag = DocumentTag(document_id=document.id, tag_name=tag_name)
+                db.session.add(tag)
         
         db.session.commit()
+        invalidate_documents([document.user_id], categories=category_changed)
         
         return jsonify({
             'message': 'Document updated successfully',
-            'document': document.to_dict()
+            'document': serialize_document(document)
         }), 200
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to update document'}), 500
@@ -283,22 +855,36 @@ def delete_document(document_id):
         return jsonify({'error': 'Access denied'}), 403
     
     try:
-        # Delete file from filesystem
-        if os.path.exists(document.filepath):
-            os.remove(document.filepath)
+        # Drop this document's reference to its file; it is deleted after the commit
+        remove_files = release_document_file(document)
+        
+        adjust_document_counters(
+            -1, -document.file_size,
+            user_id=document.user_id, category_id=document.category_id
+        )
         
         # Delete document from database (tags will be deleted by cascade)
+        user_id, category_id = document.user_id, document.category_id
         db.session.delete(document)
         db.session.commit()
-        
-        return jsonify({'message': 'Document deleted successfully'}), 200
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to delete document'}), 500
+    
+    try:
+        remove_files()
+    except OSError:
+        # The document is gone either way; a leftover file only takes space
+        pass
+    invalidate_documents([user_id], categories=bool(category_id))
+    
+    return jsonify({'message': 'Document deleted successfully'}), 200
 
 @documents_bp.route('/documents/stats', methods=['GET'])
 @jwt_required()
+@conditional_response()
+@cached_response
 def get_stats():
     """Get document statistics"""
     current_user = get_current_user()
@@ -330,4 +916,93 @@ def get_stats():
         'total_size_formatted': format_size(total_size),
         'total_users': total_users,
         'total_categories': total_categories
-    }), 200
\ No newline at end of file
+    }), 200
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+EXPORT_COLUMNS = [
+    'id', 'title', 'filename', 'file_type', 'file_size', 'description', 'upload_date',
+    'user_id', 'owner', 'category_id', 'category', 'tags'
+]
+EXPORT_BATCH_SIZE = 1000
+
+def _export_rows(query):
+    """Yield export rows from a server-side cursor, one batch at a time"""
+    rows = query.outerjoin(Category, Document.category_id == Category.id).join(
+        User, Document.user_id == User.id
+    ).with_entities(
+        Document.id, Document.title, Document.filename, Document.file_type, Document.file_size,
+        Document.description, Document.upload_date, Document.user_id, User.username,
+        Document.category_id, Category.name
+    ).order_by(Document.id).execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE)
+    
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, EXPORT_BATCH_SIZE))
+        if not batch:
+            break
+        
+        # Tags for this batch only, so memory stays flat
+        tags = {}
+        for document_id, tag_name in db.session.query(DocumentTag.document_id, DocumentTag.tag_name).filter(
+            DocumentTag.document_id.in_([row[0] for row in batch])
+        ).order_by(DocumentTag.id):
+            tags.setdefault(document_id, []).append(tag_name)
+        
+        for row in batch:
+            values = list(row)
+            values[6] = values[6].isoformat() if values[6] else None
+            values.append(tags.get(row[0], []))
+            yield dict(zip(EXPORT_COLUMNS, values))
+
+def _format_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+def _format_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+    
+    writer.writerow(EXPORT_COLUMNS)
+    yield flush()
+    
+    for row in rows:
+        row['tags'] = ';'.join(row['tags'])
+        writer.writerow([row[column] for column in EXPORT_COLUMNS])
+        yield flush()
+
+@documents_bp.route('/documents/export', methods=['GET'])
+@jwt_required()
+def export_documents():
+    """Stream document metadata as NDJSON or CSV using the listing filters"""
+    current_user = get_current_user()
+    
+    export_format = request.args.get('format', 'ndjson').strip().lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    try:
+        query, truncated = _filtered_documents_query(current_user)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = _export_rows(query)
+    body = _format_csv(rows) if export_format == 'csv' else _format_ndjson(rows)
+    
+    headers = {'Content-Disposition': f'attachment; filename=documents.{export_format}'}
+    if truncated:
+        # A fuzzy search only exports its best candidates
+        headers['X-Results-Truncated'] = 'true'
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers=headers
+    )
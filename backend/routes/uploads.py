@@ -0,0 +1,174 @@
+import os
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from models import Category, db
+from auth import get_current_user, validate_filename
+from config import Config
+from serializers import serialize_document
+from jobs import dispatch_jobs
+from filetypes import validate_content
+from storage import ChunkedUpload, ChunkOffsetMismatch, UploadCompleting, abandon_upload, purge_expired_uploads
+from cache import invalidate_documents
+from routes.documents import create_document
+
+uploads_bp = Blueprint('uploads', __name__)
+
+def _load_session(current_user, session_id):
+    """The current user's upload session with this id, or None"""
+    upload = ChunkedUpload.load(session_id)
+    if upload is None or upload.state['user_id'] != current_user.id:
+        return None
+    return upload
+
+@uploads_bp.route('/uploads', methods=['POST'])
+@jwt_required()
+def create_upload_session():
+    """Start a resumable upload; chunks are then PUT to the session"""
+    current_user = get_current_user()
+    data = request.get_json(silent=True) or {}
+    
+    filename = str(data.get('filename', '')).strip()
+    size = data.get('size')
+    title = str(data.get('title', '')).strip()
+    description = str(data.get('description', '')).strip()
+    category_id = data.get('category_id')
+    tags = data.get('tags', '')
+    
+    # Validate file
+    is_valid, message = validate_filename(filename)
+    if not is_valid:
+        return jsonify({'error': message}), 400
+    
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return jsonify({'error': 'size must be a positive integer'}), 400
+    if size > Config.MAX_CONTENT_LENGTH:
+        return jsonify({'error': 'File too large'}), 413
+    
+    # Validate category
+    if category_id:
+        category = Category.query.get(category_id)
+        if not category:
+            return jsonify({'error': 'Invalid category'}), 400
+    
+    # Sessions abandoned by other clients are cleaned up along the way
+    purge_expired_uploads()
+    
+    upload = ChunkedUpload.create(current_user.id, filename, size, metadata={
+        'title': title or filename.rsplit('.', 1)[0],
+        'description': description,
+        'category_id': category_id,
+        'tags': tags if isinstance(tags, (str, list)) else ''
+    })
+    
+    return jsonify({'upload': upload.to_dict()}), 201
+
+@uploads_bp.route('/uploads/<session_id>', methods=['GET'])
+@jwt_required()
+def get_upload_session(session_id):
+    """Get how much of an upload has been received, to resume it"""
+    upload = _load_session(get_current_user(), session_id)
+    if upload is None:
+        return jsonify({'error': 'Upload session not found'}), 404
+    
+    return jsonify({'upload': upload.to_dict()}), 200
+
+@uploads_bp.route('/uploads/<session_id>', methods=['PUT'])
+@jwt_required()
+def upload_chunk(session_id):
+    """Append the request body to an upload at ?offset=N.
+    
+    An optional X-Chunk-SHA256 header is checked against the chunk. A
+    chunk at the wrong offset gets a 409 carrying the offset to resume at.
+    """
+    upload = _load_session(get_current_user(), session_id)
+    if upload is None:
+        return jsonify({'error': 'Upload session not found'}), 404
+    
+    offset = request.args.get('offset', type=int)
+    if offset is None or offset < 0:
+        return jsonify({'error': 'offset must be a non-negative integer'}), 400
+    
+    try:
+        upload.append(offset, request.stream, checksum=request.headers.get('X-Chunk-SHA256'))
+    except ChunkOffsetMismatch as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), 409
+    except UploadCompleting as e:
+        return jsonify({'error': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e), 'offset': upload.offset}), 400
+    
+    return jsonify({'upload': upload.to_dict()}), 200
+
+@uploads_bp.route('/uploads/<session_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload_session(session_id):
+    """Create the document for a fully received upload.
+    
+    The session is claimed first, so a repeated or concurrent request
+    for it gets a 409 instead of creating a second document.
+    """
+    current_user = get_current_user()
+    
+    upload = _load_session(current_user, session_id)
+    if upload is None:
+        return jsonify({'error': 'Upload session not found'}), 404
+    
+    try:
+        upload.complete()
+    except UploadCompleting as e:
+        return jsonify({'error': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e), 'offset': upload.offset}), 400
+    
+    is_valid, message = validate_content(upload, upload.state['filename'])
+    if not is_valid:
+        upload.discard()
+        return jsonify({'error': message}), 400
+    
+    metadata = upload.state['metadata']
+    category_id = metadata.get('category_id')
+    
+    # The category may have been deleted while the upload was in progress
+    if category_id and not Category.query.get(category_id):
+        upload.release()
+        return jsonify({'error': 'Invalid category'}), 400
+    
+    try:
+        document = create_document(
+            current_user, upload, upload.state['filename'],
+            title=metadata['title'], description=metadata['description'],
+            category_id=category_id, tags=metadata['tags']
+        )
+        
+        db.session.commit()
+        upload.discard()
+        invalidate_documents([current_user.id], categories=bool(category_id))
+        
+        # Process the file without making the upload wait
+        dispatch_jobs()
+        
+        return jsonify({
+            'message': 'Document uploaded successfully',
+            'document': serialize_document(document)
+        }), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        # Keep the session for a retry unless its file was already moved
+        if os.path.exists(upload.path):
+            upload.release()
+        else:
+            abandon_upload(upload)
+            upload.discard()
+        return jsonify({'error': 'Failed to upload document'}), 500
+
+@uploads_bp.route('/uploads/<session_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_upload_session(session_id):
+    """Abandon an upload and delete what was received of it"""
+    upload = _load_session(get_current_user(), session_id)
+    if upload is None:
+        return jsonify({'error': 'Upload session not found'}), 404
+    
+    upload.discard()
+    return jsonify({'message': 'Upload cancelled'}), 200
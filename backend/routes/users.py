@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from models import User, db
 from auth import admin_required
+from cache import invalidate_users
 
 users_bp = Blueprint('users', __name__)
 
@@ -48,6 +49,7 @@ def register():
     try:
         db.session.add(new_user)
         db.session.commit()
+        invalidate_users()
         
         # Create access token
         access_token = create_access_token(identity=str(new_user.id))
@@ -127,6 +129,7 @@ def delete_user(user_id):
         # Delete user's documents first (cascade should handle this)
         db.session.delete(user)
         db.session.commit()
+        invalidate_users()
         
         return jsonify({'message': 'User deleted successfully'}), 200
         
@@ -0,0 +1,475 @@
+import re
+from sqlalchemy import inspect, text, literal, literal_column, case
+from sqlalchemy.exc import OperationalError
+from config import Config
+from models import Document, DocumentContent, db
+
+# Whether a table's full-text index exists, cached per database engine
+_index_available = {}
+
+SQLITE_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+    "title, description, content='documents', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    
+    # Keep the external-content index in sync with the documents table
+    "CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN "
+    "INSERT INTO documents_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    
+    "CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN "
+    "INSERT INTO documents_fts(documents_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+    
+    "CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE OF title, description ON documents BEGIN "
+    "INSERT INTO documents_fts(documents_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO documents_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+]
+
+SQLITE_CONTENT_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS document_contents_fts USING fts5("
+    "content, content='document_contents', content_rowid='document_id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    
+    "CREATE TRIGGER IF NOT EXISTS document_contents_fts_insert AFTER INSERT ON document_contents BEGIN "
+    "INSERT INTO document_contents_fts(rowid, content) VALUES (new.document_id, new.content); "
+    "END",
+    
+    "CREATE TRIGGER IF NOT EXISTS document_contents_fts_delete AFTER DELETE ON document_contents BEGIN "
+    "INSERT INTO document_contents_fts(document_contents_fts, rowid, content) "
+    "VALUES ('delete', old.document_id, old.content); "
+    "END",
+    
+    "CREATE TRIGGER IF NOT EXISTS document_contents_fts_update AFTER UPDATE OF content ON document_contents BEGIN "
+    "INSERT INTO document_contents_fts(document_contents_fts, rowid, content) "
+    "VALUES ('delete', old.document_id, old.content); "
+    "INSERT INTO document_contents_fts(rowid, content) VALUES (new.document_id, new.content); "
+    "END",
+]
+
+POSTGRES_VECTOR_DDL = (
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+    ") STORED"
+)
+
+POSTGRES_CONTENT_VECTOR_DDL = (
+    "ALTER TABLE document_contents ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED"
+)
+
+def _install_index(engine, table, sqlite_ddl, postgres_ddl):
+    from migrations import create_index
+    
+    try:
+        if engine.dialect.name == 'sqlite':
+            with engine.begin() as connection:
+                for statement in sqlite_ddl:
+                    connection.execute(text(statement))
+                connection.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+        elif engine.dialect.name == 'postgresql':
+            with engine.begin() as connection:
+                connection.execute(text(postgres_ddl))
+            create_index(engine, f'ix_{table}_search_vector', table, 'search_vector', using='gin')
+        else:
+            return False
+    except OperationalError:
+        # SQLite built without FTS5
+        return False
+    finally:
+        _index_available.pop((engine, table), None)
+    
+    return True
+
+def install_search_index(engine):
+    """Create the full-text index for document titles and descriptions.
+    
+    SQLite gets an external-content FTS5 table maintained by triggers on
+    documents; PostgreSQL gets a generated tsvector column with a GIN
+    index. Returns False when the database lacks full-text support, in
+    which case searches keep using ILIKE.
+    """
+    return _install_index(engine, 'documents', SQLITE_INDEX_DDL, POSTGRES_VECTOR_DDL)
+
+def install_content_index(engine):
+    """Create the full-text index over extracted file contents"""
+    return _install_index(engine, 'document_contents', SQLITE_CONTENT_INDEX_DDL, POSTGRES_CONTENT_VECTOR_DDL)
+
+def search_index_available(table='documents'):
+    """Return True if the full-text index on ``table`` can be queried"""
+    engine = db.engine
+    if (engine, table) not in _index_available:
+        if engine.dialect.name == 'sqlite':
+            available = inspect(engine).has_table(f'{table}_fts')
+        elif engine.dialect.name == 'postgresql':
+            available = any(
+                column['name'] == 'search_vector'
+                for column in inspect(engine).get_columns(table)
+            )
+        else:
+            available = False
+        _index_available[(engine, table)] = available
+    
+    return _index_available[(engine, table)]
+
+def search_terms(search):
+    """Split a search string into the word tokens the index understands"""
+    return re.findall(r'\w+', search)
+
+def _fts_match(terms):
+    # Quote each term so user input can't inject FTS5 query syntax
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def _ts_query(terms):
+    return db.func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+
+def apply_search(query, search, ranked=False):
+    """Restrict a document query to matches for ``search``.
+    
+    Every word must match as a prefix ("rep" finds "report"). With
+    ``ranked`` the best matches come first; keyset pagination leaves it off
+    since it needs its own ordering. Falls back to the ILIKE substring
+    search when the full-text index is not available.
+    """
+    terms = search_terms(search)
+    
+    if not terms or not search_index_available():
+        search_pattern = f"%{search}%"
+        return query.filter(
+            (Document.title.ilike(search_pattern)) |
+            (Document.description.ilike(search_pattern))
+        )
+    
+    if db.engine.dialect.name == 'postgresql':
+        ts_query = _ts_query(terms)
+        search_vector = literal_column('documents.search_vector')
+        query = query.filter(search_vector.op('@@')(ts_query))
+        if ranked:
+            query = query.order_by(db.func.ts_rank_cd(search_vector, ts_query).desc())
+        return query
+    
+    matches = text(
+        "SELECT rowid AS document_id, bm25(documents_fts, 10.0, 1.0) AS rank "
+        "FROM documents_fts WHERE documents_fts MATCH :match"
+    ).bindparams(match=_fts_match(terms)).columns(
+        document_id=db.Integer, rank=db.Float
+    ).subquery('search_matches')
+    
+    query = query.join(matches, matches.c.document_id == Document.id)
+    if ranked:
+        # bm25() scores are negative; lower is a better match
+        query = query.order_by(matches.c.rank)
+    return query
+
+def apply_content_search(query, search):
+    """Restrict a document query to documents whose file contents match ``search``"""
+    terms = search_terms(search)
+    
+    if not terms or not search_index_available('document_contents'):
+        matching_ids = db.select(DocumentContent.document_id).where(
+            DocumentContent.content.ilike(f"%{search}%")
+        )
+    elif db.engine.dialect.name == 'postgresql':
+        matching_ids = db.select(DocumentContent.document_id).where(
+            literal_column('document_contents.search_vector').op('@@')(_ts_query(terms))
+        )
+    else:
+        matching_ids = text(
+            "SELECT rowid FROM document_contents_fts WHERE document_contents_fts MATCH :match"
+        ).bindparams(match=_fts_match(terms))
+    
+    return query.filter(Document.id.in_(matching_ids))
+
+SQLITE_TRIGRAM_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS documents_trigram USING fts5("
+    "title, filename, content='documents', content_rowid='id', tokenize='trigram')",
+    
+    "CREATE TRIGGER IF NOT EXISTS documents_trigram_insert AFTER INSERT ON documents BEGIN "
+    "INSERT INTO documents_trigram(rowid, title, filename) VALUES (new.id, new.title, new.filename); "
+    "END",
+    
+    "CREATE TRIGGER IF NOT EXISTS documents_trigram_delete AFTER DELETE ON documents BEGIN "
+    "INSERT INTO documents_trigram(documents_trigram, rowid, title, filename) "
+    "VALUES ('delete', old.id, old.title, old.filename); "
+    "END",
+    
+    "CREATE TRIGGER IF NOT EXISTS documents_trigram_update AFTER UPDATE OF title, filename ON documents BEGIN "
+    "INSERT INTO documents_trigram(documents_trigram, rowid, title, filename) "
+    "VALUES ('delete', old.id, old.title, old.filename); "
+    "INSERT INTO documents_trigram(rowid, title, filename) VALUES (new.id, new.title, new.filename); "
+    "END",
+]
+
+# Expression indexed by pg_trgm on PostgreSQL
+POSTGRES_TRIGRAM_EXPRESSION = "(lower(title) || ' ' || lower(filename))"
+
+def install_trigram_index(engine):
+    """Create the trigram index used for typo-tolerant title/filename search.
+    
+    SQLite (3.34+) gets an FTS5 table with the trigram tokenizer, kept in
+    sync by triggers; PostgreSQL gets a pg_trgm GIN index. Returns False
+    when neither is available and fuzzy searches fall back to ILIKE.
+    """
+    from migrations import create_index
+    
+    try:
+        if engine.dialect.name == 'sqlite':
+            with engine.begin() as connection:
+                for statement in SQLITE_TRIGRAM_INDEX_DDL:
+                    connection.execute(text(statement))
+                connection.execute(text("INSERT INTO documents_trigram(documents_trigram) VALUES ('rebuild')"))
+        elif engine.dialect.name == 'postgresql':
+            with engine.begin() as connection:
+                connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            create_index(
+                engine, 'ix_documents_title_trigram', 'documents',
+                f'{POSTGRES_TRIGRAM_EXPRESSION} gin_trgm_ops', using='gin'
+            )
+        else:
+            return False
+    except OperationalError:
+        # SQLite without the trigram tokenizer
+        return False
+    finally:
+        _index_available.pop((engine, 'trigram'), None)
+    
+    return True
+
+def trigram_index_available():
+    """Return True if the trigram index can be queried"""
+    engine = db.engine
+    if (engine, 'trigram') not in _index_available:
+        if engine.dialect.name == 'sqlite':
+            available = inspect(engine).has_table('documents_trigram')
+        elif engine.dialect.name == 'postgresql':
+            with engine.connect() as connection:
+                available = connection.execute(text(
+                    "SELECT 1 FROM pg_indexes WHERE indexname = 'ix_documents_title_trigram'"
+                )).first() is not None
+        else:
+            available = False
+        _index_available[(engine, 'trigram')] = available
+    
+    return _index_available[(engine, 'trigram')]
+
+def trigrams(value):
+    """Trigram set of a string, padding each word like pg_trgm does"""
+    result = set()
+    for word in re.findall(r'\w+', value.lower()):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+def trigram_similarity(search_trigrams, value):
+    """Share of the search's trigrams found in ``value`` (0 to 1)"""
+    if not search_trigrams:
+        return 0.0
+    return len(search_trigrams & trigrams(value)) / len(search_trigrams)
+
+def apply_fuzzy_search(query, search, ranked=False):
+    """Restrict a document query to titles or filenames similar to ``search``.
+    
+    Candidates sharing trigrams with the search come from the trigram
+    index, best matches first; the top FUZZY_SEARCH_CANDIDATES are then
+    scored exactly and kept when at least FUZZY_SEARCH_THRESHOLD of the
+    search's trigrams appear in the title or filename. Falls back to the
+    ILIKE substring search without the index or for searches shorter than
+    three characters.
+    
+    Returns (query, truncated); truncated is True when more candidates
+    than FUZZY_SEARCH_CANDIDATES matched, so some similar documents may
+    be missing from the results.
+    """
+    search = search.strip().lower()
+    
+    if len(search) < 3 or not trigram_index_available():
+        search_pattern = f"%{search}%"
+        return query.filter(
+            (Document.title.ilike(search_pattern)) |
+            (Document.filename.ilike(search_pattern))
+        ), False
+    
+    if db.engine.dialect.name == 'postgresql':
+        expression = literal_column(POSTGRES_TRIGRAM_EXPRESSION)
+        # <% uses the GIN index with pg_trgm.word_similarity_threshold (0.6
+        # by default); match SQLite's threshold for this transaction
+        db.session.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+            {'threshold': str(Config.FUZZY_SEARCH_THRESHOLD)}
+        )
+        query = query.filter(literal(search).op('<%')(expression))
+        if ranked:
+            query = query.order_by(db.func.word_similarity(search, expression).desc())
+        return query, False
+    
+    # Any shared trigram makes a candidate; bm25 puts those sharing most first
+    match = ' OR '.join(
+        '"{}"'.format(search[i:i + 3].replace('"', '""'))
+        for i in range(len(search) - 2)
+    )
+    matches = text(
+        "SELECT rowid AS document_id, bm25(documents_trigram) AS rank "
+        "FROM documents_trigram WHERE documents_trigram MATCH :match"
+    ).bindparams(match=match).columns(
+        document_id=db.Integer, rank=db.Float
+    ).subquery('trigram_matches')
+    
+    candidates = query.order_by(None).join(
+        matches, matches.c.document_id == Document.id
+    ).with_entities(
+        Document.id, Document.title, Document.filename
+    ).order_by(matches.c.rank).limit(Config.FUZZY_SEARCH_CANDIDATES + 1).all()
+    
+    truncated = len(candidates) > Config.FUZZY_SEARCH_CANDIDATES
+    candidates = candidates[:Config.FUZZY_SEARCH_CANDIDATES]
+    
+    search_trigrams = trigrams(search)
+    scored = []
+    for document_id, title, filename in candidates:
+        score = max(
+            trigram_similarity(search_trigrams, title),
+            trigram_similarity(search_trigrams, filename.rsplit('.', 1)[0])
+        )
+        if score >= Config.FUZZY_SEARCH_THRESHOLD:
+            scored.append((score, document_id))
+    
+    scored.sort(key=lambda item: -item[0])
+    document_ids = [document_id for _, document_id in scored]
+    
+    query = query.filter(Document.id.in_(document_ids))
+    if ranked and document_ids:
+        positions = {document_id: position for position, document_id in enumerate(document_ids)}
+        query = query.order_by(case(positions, value=Document.id))
+    return query, truncated
+
+# Markers the database wraps around matches; replaced by offsets in the response
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_WORDS = 16
+SNIPPET_ELLIPSIS = '…'
+
+def _parse_marked(marked):
+    # Turn marker-delimited text into plain text plus [start, end) offsets
+    parts = []
+    matches = []
+    length = 0
+    start = None
+    for piece in re.split(f'([{MATCH_START}{MATCH_END}])', marked or ''):
+        if piece == MATCH_START:
+            start = length
+        elif piece == MATCH_END:
+            if start is not None:
+                matches.append([start, length])
+                start = None
+        else:
+            parts.append(piece)
+            length += len(piece)
+    return {'text': ''.join(parts), 'matches': matches}
+
+def _text_snippet(value, spans, words=None):
+    # Cut a window of ``words`` words around the first match, like FTS5 snippet()
+    value = value or ''
+    start, end = 0, len(value)
+    word_spans = [match.span() for match in re.finditer(r'\S+', value)]
+    
+    if words is not None and len(word_spans) > words:
+        first = spans[0][0] if spans else 0
+        index = next((i for i, (_, word_end) in enumerate(word_spans) if word_end > first), 0)
+        begin = max(0, min(index - words // 4, len(word_spans) - words))
+        start, end = word_spans[begin][0], word_spans[begin + words - 1][1]
+    
+    prefix = SNIPPET_ELLIPSIS if start > 0 else ''
+    suffix = SNIPPET_ELLIPSIS if end < len(value) else ''
+    offset = len(prefix) - start
+    return {
+        'text': prefix + value[start:end] + suffix,
+        'matches': [[s + offset, e + offset] for s, e in spans if s >= start and e <= end]
+    }
+
+def _term_spans(terms, search):
+    # Prefix matches at word starts, or the raw substring when there are no words
+    if terms:
+        pattern = re.compile(r'\b(?:{})\w*'.format('|'.join(map(re.escape, terms))), re.IGNORECASE)
+    else:
+        pattern = re.compile(re.escape(search.strip()), re.IGNORECASE)
+    return lambda value: [match.span() for match in pattern.finditer(value or '')]
+
+def _fuzzy_spans(search):
+    # Words sharing enough trigrams with the search
+    search_trigrams = trigrams(search)
+    
+    def spans(value):
+        result = []
+        for match in re.finditer(r'\w+', value or ''):
+            word_trigrams = trigrams(match.group())
+            shared = len(word_trigrams & search_trigrams)
+            if word_trigrams and search_trigrams and max(
+                shared / len(word_trigrams), shared / len(search_trigrams)
+            ) >= Config.FUZZY_SEARCH_THRESHOLD:
+                result.append(match.span())
+        return result
+    return spans
+
+def _index_snippets(document_ids, terms):
+    ids = list(document_ids)
+    if db.engine.dialect.name == 'postgresql':
+        ts_query = _ts_query(terms)
+        selectors = f'StartSel={MATCH_START}, StopSel={MATCH_END}'
+        rows = db.session.query(
+            Document.id,
+            db.func.ts_headline('simple', Document.title, ts_query, f'{selectors}, HighlightAll=true'),
+            db.func.ts_headline(
+                'simple', db.func.coalesce(Document.description, ''), ts_query,
+                f'{selectors}, MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}'
+            )
+        ).filter(Document.id.in_(ids)).all()
+    else:
+        rows = db.session.execute(text(
+            "SELECT rowid, highlight(documents_fts, 0, char(2), char(3)), "
+            "snippet(documents_fts, 1, char(2), char(3), :ellipsis, :words) "
+            "FROM documents_fts WHERE documents_fts MATCH :match AND rowid IN :ids"
+        ).bindparams(
+            db.bindparam('ids', expanding=True),
+            match=_fts_match(terms), ellipsis=SNIPPET_ELLIPSIS, words=SNIPPET_WORDS, ids=ids
+        )).all()
+    
+    return {
+        document_id: {'title': _parse_marked(title), 'description': _parse_marked(description)}
+        for document_id, title, description in rows
+    }
+
+def search_snippets(document_ids, search, fuzzy=False):
+    """Highlighted title and description snippets for a page of search results.
+    
+    Returns {document_id: {'title': ..., 'description': ...}} where each
+    value is {'text': ..., 'matches': [[start, end], ...]}: the title in
+    full and a window of about SNIPPET_WORDS words of the description,
+    with character offsets of every match. Uses the full-text index's
+    highlighting when available and scans the page's text otherwise.
+    """
+    if not document_ids:
+        return {}
+    
+    terms = search_terms(search)
+    snippets = {}
+    if not fuzzy and terms and search_index_available():
+        snippets = _index_snippets(document_ids, terms)
+    
+    missing = [document_id for document_id in document_ids if document_id not in snippets]
+    if missing:
+        spans = _fuzzy_spans(search) if fuzzy else _term_spans(terms, search)
+        rows = db.session.query(
+            Document.id, Document.title, Document.description
+        ).filter(Document.id.in_(missing)).all()
+        for document_id, title, description in rows:
+            snippets[document_id] = {
+                'title': _text_snippet(title, spans(title)),
+                'description': _text_snippet(description, spans(description), SNIPPET_WORDS)
+            }
+    
+    return snippets
@@ -0,0 +1,597 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import hashlib
+import contextlib
+import threading
+from datetime import datetime
+from flask import Request
+from sqlalchemy.exc import IntegrityError
+from config import Config
+from auth import secure_filename_custom
+from models import Blob, Document, db
+
+try:
+    import fcntl
+except ImportError:  # Windows: chunks are only serialized within a process
+    fcntl = None
+
+# Bytes copied per read when an upload has to be copied after all
+COPY_CHUNK_SIZE = 64 * 1024
+
+def upload_extension(filename):
+    """Lower-case extension of a client filename, or '' when it has none"""
+    filename = secure_filename_custom(filename or '')
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+class StoredUpload:
+    """An uploaded file written straight to its final path in UPLOAD_FOLDER.
+    
+    Bytes are hashed and counted as they are written, so the size and
+    SHA-256 are known as soon as the request body has been read, and the
+    first MIME_SNIFF_BYTES are kept for type detection. The file is
+    deleted when the request ends unless the view claims it.
+    """
+    
+    def __init__(self, extension, directory=None):
+        directory = directory or Config.UPLOAD_FOLDER
+        os.makedirs(directory, exist_ok=True)
+        
+        self.path = os.path.join(directory, f'{uuid.uuid4().hex}.{extension}')
+        self.size = 0
+        self.head = b''
+        self.claimed = False
+        self._hash = hashlib.sha256()
+        self._file = open(self.path, 'w+b')
+    
+    def write(self, data):
+        if len(self.head) < Config.MIME_SNIFF_BYTES:
+            self.head += data[:Config.MIME_SNIFF_BYTES - len(self.head)]
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+    
+    def __getattr__(self, name):
+        # read/seek/close for FileStorage go to the underlying file
+        return getattr(self._file, name)
+    
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+    
+    def claim(self):
+        """Keep the file after the request; returns its path.
+        
+        Like discard(), safe to call once the file has been closed.
+        """
+        self._file.close()
+        self.claimed = True
+        return self.path
+    
+    def discard(self):
+        """Close and delete the file"""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def copy_upload(stream, filename):
+    """Copy a readable stream into a new StoredUpload, hashing it on the way.
+    
+    The file is closed once the copy is done, so holding many copies
+    (one per archive member) doesn't hold a file descriptor for each.
+    """
+    upload = StoredUpload(upload_extension(filename))
+    try:
+        while True:
+            chunk = stream.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            upload.write(chunk)
+    except Exception:
+        upload.discard()
+        raise
+    
+    upload.close()
+    return upload
+
+def store_upload(file):
+    """Return the StoredUpload holding a request's FileStorage.
+    
+    Multipart uploads parsed by UploadRequest are already on disk; any
+    other stream is copied once into UPLOAD_FOLDER.
+    """
+    if isinstance(file.stream, StoredUpload):
+        return file.stream
+    
+    file.stream.seek(0)
+    return copy_upload(file.stream, file.filename)
+
+class UploadRequest(Request):
+    """Request that streams uploaded files directly into UPLOAD_FOLDER.
+    
+    Werkzeug normally spools every file part into a temporary file that
+    the view then copies again; here each part of an allowed type is
+    written once, to the location it is stored at, while it is parsed.
+    Files the view doesn't claim are removed when the request closes.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        extension = upload_extension(filename)
+        if extension not in Config.ALLOWED_EXTENSIONS:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        
+        upload = StoredUpload(extension)
+        self.__dict__.setdefault('_stored_uploads', []).append(upload)
+        return upload
+    
+    def close(self):
+        super().close()
+        for upload in self.__dict__.pop('_stored_uploads', []):
+            if not upload.claimed:
+                upload.discard()
+
+def blob_path(sha256):
+    """Location in the blob store of the contents with this SHA-256"""
+    return os.path.join(Config.UPLOAD_FOLDER, 'blobs', sha256[:2], sha256[2:4], sha256)
+
+def remove_blob_files(sha256):
+    """Delete a blob and the files derived from it (e.g. thumbnails) next to it"""
+    directory = os.path.dirname(blob_path(sha256))
+    if not os.path.isdir(directory):
+        return
+    
+    for name in os.listdir(directory):
+        if name == sha256 or name.startswith(f'{sha256}.'):
+            os.remove(os.path.join(directory, name))
+
+# Placing and deleting blob files is serialized per leading byte of the hash
+_blob_locks = [threading.Lock() for _ in range(256)]
+
+@contextlib.contextmanager
+def _blob_lock(sha256):
+    directory = os.path.join(Config.UPLOAD_FOLDER, 'blobs', 'locks')
+    os.makedirs(directory, exist_ok=True)
+    with _blob_locks[int(sha256[:2], 16)], open(os.path.join(directory, sha256[:2]), 'a+b') as f:
+        if fcntl is not None:
+            # Other worker processes place and delete blobs too
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+def _file_identity(path):
+    # Tells a blob file apart from one of the same contents put there later
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+def hash_file(path):
+    """SHA-256 hex digest of a file on disk"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _increment_references(sha256, delta):
+    return Blob.query.filter_by(sha256=sha256).update(
+        {Blob.ref_count: Blob.ref_count + delta}, synchronize_session=False
+    )
+
+def acquire_blob(upload):
+    """Take a reference to the blob holding a claimed upload's contents.
+    
+    Runs inside the caller's transaction. The upload is renamed into the
+    blob store even over an existing file of the same contents: a pending
+    deletion of the old file then finds a different one and keeps it.
+    Returns the blob's path for Document.filepath.
+    """
+    path = blob_path(upload.sha256)
+    
+    # The row lock taken here keeps release_blob() from dropping the
+    # last reference until this transaction ends
+    if not _increment_references(upload.sha256, 1):
+        try:
+            with db.session.begin_nested():
+                db.session.add(Blob(sha256=upload.sha256, size=upload.size, ref_count=1))
+        except IntegrityError:
+            # Another upload of the same contents created it concurrently
+            _increment_references(upload.sha256, 1)
+    
+    with _blob_lock(upload.sha256):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(upload.path, path)
+        upload.blob_identity = _file_identity(path)
+    return path
+
+def release_blob(sha256):
+    """Drop a reference to a blob inside the caller's transaction.
+    
+    Returns True when that was the last reference and the Blob row was
+    deleted; the files are left for remove_unreferenced_blob() to delete
+    once the transaction has committed.
+    """
+    _increment_references(sha256, -1)
+    unreferenced = Blob.query.filter(
+        Blob.sha256 == sha256, Blob.ref_count <= 0
+    ).delete(synchronize_session=False)
+    return bool(unreferenced)
+
+def remove_unreferenced_blob(sha256, identity):
+    """Delete a blob's files after the commit that dropped its last reference.
+    
+    ``identity`` is the file's from before it was released. An upload of
+    the same contents may have put a new file in its place since, maybe
+    in a transaction not committed yet; that file is kept.
+    """
+    with _blob_lock(sha256):
+        if _file_identity(blob_path(sha256)) == identity and db.session.get(Blob, sha256) is None:
+            remove_blob_files(sha256)
+
+def in_blob_store(document):
+    """True if a document's file is a shared blob rather than a file of its own"""
+    return bool(document.sha256) and document.filepath == blob_path(document.sha256)
+
+def release_document_file(document):
+    """Release the stored file of a document that is being deleted.
+    
+    Runs inside the caller's transaction and returns a function deleting
+    the files nothing refers to any more. Call it only after the commit,
+    so a rolled-back delete keeps the document's file.
+    """
+    if in_blob_store(document):
+        sha256 = document.sha256
+        identity = _file_identity(blob_path(sha256))
+        if release_blob(sha256):
+            return lambda: remove_unreferenced_blob(sha256, identity)
+        return lambda: None
+    
+    filepath = document.filepath
+    def remove_file():
+        if os.path.exists(filepath):
+            os.remove(filepath)
+    return remove_file
+
+def abandon_upload(upload):
+    """Clean up after an upload whose transaction was rolled back.
+    
+    Deletes the claimed file if it is still in place, and the blob file
+    it became if no committed document refers to it and no other upload
+    has replaced it since.
+    """
+    if os.path.exists(upload.path):
+        os.remove(upload.path)
+    
+    identity = getattr(upload, 'blob_identity', None)
+    if identity is not None:
+        remove_unreferenced_blob(upload.sha256, identity)
+
+def recompute_blob_references():
+    """Recompute blob reference counts from the documents pointing at them.
+    
+    Blobs no document refers to any more are deleted.
+    """
+    references = {}
+    rows = db.session.query(Document.sha256, Document.filepath, Document.file_size).filter(
+        Document.sha256.isnot(None)
+    )
+    for sha256, filepath, file_size in rows:
+        if filepath == blob_path(sha256):
+            count, _ = references.get(sha256, (0, file_size))
+            references[sha256] = (count + 1, file_size)
+    
+    unreferenced = []
+    for blob in Blob.query.all():
+        if blob.sha256 not in references:
+            db.session.delete(blob)
+            unreferenced.append((blob.sha256, _file_identity(blob_path(blob.sha256))))
+        else:
+            blob.ref_count = references.pop(blob.sha256)[0]
+    
+    for sha256, (count, size) in references.items():
+        db.session.add(Blob(sha256=sha256, size=size, ref_count=count))
+    
+    db.session.commit()
+    
+    for sha256, identity in unreferenced:
+        remove_unreferenced_blob(sha256, identity)
+
+# Documents moved into the blob store per commit
+MIGRATION_BATCH_SIZE = 100
+
+def migrate_files_to_blobs():
+    """Move every document's own file into the blob store, merging duplicates.
+    
+    Each file is linked (or copied) into place and only removed once the
+    new path has been committed, so an interrupted run can be repeated.
+    """
+    last_id = 0
+    while True:
+        rows = db.session.query(Document.id, Document.filepath, Document.sha256).filter(
+            Document.id > last_id
+        ).order_by(Document.id).limit(MIGRATION_BATCH_SIZE).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        
+        moved = []
+        for document_id, filepath, current_sha256 in rows:
+            in_store = bool(current_sha256) and filepath == blob_path(current_sha256)
+            if in_store or not os.path.exists(filepath):
+                continue
+            
+            sha256 = hash_file(filepath)
+            path = blob_path(sha256)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                try:
+                    os.link(filepath, path)
+                except OSError:
+                    shutil.copyfile(filepath, path)
+            
+            moved.append(filepath)
+            db.session.execute(
+                db.update(Document).where(Document.id == document_id).values(sha256=sha256, filepath=path)
+            )
+        
+        db.session.commit()
+        for filepath in moved:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+    
+    recompute_blob_references()
+
+class ChunkOffsetMismatch(ValueError):
+    """Raised when a chunk does not start where the upload currently ends"""
+    
+    def __init__(self, offset):
+        super().__init__(f'Chunk must start at offset {offset}')
+        self.offset = offset
+
+class UploadCompleting(ValueError):
+    """Raised when an upload is already being completed by another request"""
+
+# Running SHA-256 of sessions active in this process: id -> (offset, hash)
+_session_hashes = {}
+_session_locks = {}
+_session_lock = threading.Lock()
+
+class ChunkedUpload:
+    """A resumable upload assembled on disk from sequential chunks.
+    
+    Each session lives in UPLOAD_FOLDER/sessions/<id>/ as the partial
+    file plus a session.json recording its metadata and the offset up to
+    which chunks have been verified. Chunks are appended in order, so the
+    whole-file SHA-256 is updated as they arrive and the finished file
+    never has to be read again (unless the process restarted meanwhile).
+    """
+    
+    def __init__(self, session_id, state):
+        self.id = session_id
+        self.state = state
+        self.sha256 = None
+    
+    @staticmethod
+    def sessions_directory():
+        return os.path.join(Config.UPLOAD_FOLDER, 'sessions')
+    
+    @property
+    def directory(self):
+        return os.path.join(self.sessions_directory(), self.id)
+    
+    @property
+    def path(self):
+        return os.path.join(self.directory, 'data')
+    
+    @property
+    def size(self):
+        return self.state['size']
+    
+    @property
+    def offset(self):
+        return self.state['offset']
+    
+    @property
+    def completing(self):
+        """True while a completion has claimed the session and not yet given it up"""
+        started = self.state.get('completing_at')
+        return bool(started) and (
+            datetime.fromisoformat(started) + Config.UPLOAD_COMPLETION_TIMEOUT > datetime.utcnow()
+        )
+    
+    @property
+    def expires_at(self):
+        return datetime.fromisoformat(self.state['updated_at']) + Config.UPLOAD_SESSION_TTL
+    
+    @classmethod
+    def create(cls, user_id, filename, size, metadata=None):
+        """Start a session for a file of ``size`` bytes"""
+        upload = cls(uuid.uuid4().hex, {
+            'user_id': user_id,
+            'filename': filename,
+            'size': size,
+            'offset': 0,
+            'metadata': metadata or {},
+            'updated_at': datetime.utcnow().isoformat()
+        })
+        os.makedirs(upload.directory)
+        open(upload.path, 'wb').close()
+        upload._save()
+        return upload
+    
+    @classmethod
+    def load(cls, session_id):
+        """Return the session with this id, or None"""
+        if not re.fullmatch(r'[0-9a-f]{32}', session_id):
+            return None
+        try:
+            with open(os.path.join(cls.sessions_directory(), session_id, 'session.json')) as f:
+                return cls(session_id, json.load(f))
+        except (OSError, ValueError):
+            return None
+    
+    def _save(self):
+        # Write then rename so a crash never leaves a truncated state file
+        state_path = os.path.join(self.directory, 'session.json')
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump(self.state, f)
+        os.replace(state_path + '.tmp', state_path)
+    
+    def _lock(self):
+        with _session_lock:
+            return _session_locks.setdefault(self.id, threading.Lock())
+    
+    @contextlib.contextmanager
+    def _locked(self):
+        # Hold the session against other threads and worker processes, and
+        # pick up the state other processes saved
+        with self._lock():
+            try:
+                f = open(self.path, 'r+b')
+            except OSError:
+                raise ValueError('Upload session not found')
+            with f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                current = ChunkedUpload.load(self.id)
+                if current is None:
+                    raise ValueError('Upload session not found')
+                self.state = current.state
+                yield f
+    
+    def _running_hash(self):
+        cached = _session_hashes.get(self.id)
+        if cached and cached[0] == self.offset:
+            return cached[1]
+        
+        # Another process (or one since restarted) received the earlier chunks
+        digest = hashlib.sha256()
+        remaining = self.offset
+        with open(self.path, 'rb') as f:
+            while remaining:
+                chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+        return digest
+    
+    def append(self, offset, stream, checksum=None):
+        """Append a chunk read from ``stream`` at ``offset``.
+        
+        ``checksum`` is the chunk's expected SHA-256; on a mismatch the
+        chunk is dropped and ValueError raised. Raises ChunkOffsetMismatch
+        unless ``offset`` is where the upload currently ends.
+        """
+        with self._locked() as f:
+            if self.completing:
+                raise UploadCompleting('Upload is being completed')
+            if offset != self.offset:
+                raise ChunkOffsetMismatch(self.offset)
+            
+            running = self._running_hash().copy()
+            chunk_hash = hashlib.sha256()
+            received = 0
+            
+            # Discard bytes of an earlier chunk that was never verified
+            f.truncate(offset)
+            f.seek(offset)
+            for data in iter(lambda: stream.read(COPY_CHUNK_SIZE), b''):
+                received += len(data)
+                if offset + received > self.size:
+                    f.truncate(offset)
+                    raise ValueError('Chunk exceeds the declared file size')
+                f.write(data)
+                chunk_hash.update(data)
+                running.update(data)
+            
+            if checksum and chunk_hash.hexdigest() != checksum.lower():
+                f.truncate(offset)
+                raise ValueError('Chunk checksum mismatch')
+            
+            f.flush()
+            self.state['offset'] = offset + received
+            self.state['updated_at'] = datetime.utcnow().isoformat()
+            self._save()
+            _session_hashes[self.id] = (self.offset, running)
+    
+    def complete(self):
+        """Claim a fully received upload for completion; sets ``sha256``.
+        
+        The session is marked as completing in session.json while locked
+        like append(), so further chunks and concurrent or repeated
+        completions get UploadCompleting. Call release() if the completion
+        fails and may be retried; discard() once it succeeded.
+        """
+        with self._locked():
+            if self.completing:
+                raise UploadCompleting('Upload is already being completed')
+            if self.offset != self.size:
+                raise ValueError(f'Upload is incomplete: {self.offset} of {self.size} bytes received')
+            
+            self.sha256 = self._running_hash().hexdigest()
+            self.state['completing_at'] = datetime.utcnow().isoformat()
+            self._save()
+        return self
+    
+    def release(self):
+        """Give up a completion so that it can be retried"""
+        with self._locked():
+            self.state.pop('completing_at', None)
+            self.state['updated_at'] = datetime.utcnow().isoformat()
+            self._save()
+    
+    def discard(self):
+        """Delete the session and whatever is left of its file"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        _forget_session(self.id)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.state['filename'],
+            'size': self.size,
+            'offset': self.offset,
+            'completing': self.completing,
+            'expires_at': self.expires_at.isoformat()
+        }
+
+def _forget_session(session_id):
+    # Drop this process's running hash and lock of a finished session
+    _session_hashes.pop(session_id, None)
+    with _session_lock:
+        _session_locks.pop(session_id, None)
+
+def purge_expired_uploads():
+    """Delete upload sessions idle for longer than UPLOAD_SESSION_TTL.
+    
+    Also forgets the in-process state of sessions that other processes
+    completed, cancelled or purged.
+    """
+    directory = ChunkedUpload.sessions_directory()
+    if not os.path.isdir(directory):
+        return 0
+    
+    purged = 0
+    now = datetime.utcnow()
+    for session_id in os.listdir(directory):
+        upload = ChunkedUpload.load(session_id)
+        if upload is not None:
+            expired = upload.expires_at < now
+        else:
+            # Unreadable leftovers are judged by their modification time
+            modified = datetime.utcfromtimestamp(os.path.getmtime(os.path.join(directory, session_id)))
+            expired = modified + Config.UPLOAD_SESSION_TTL < now
+        
+        if expired:
+            shutil.rmtree(os.path.join(directory, session_id), ignore_errors=True)
+            _forget_session(session_id)
+            purged += 1
+    
+    remaining = set(os.listdir(directory))
+    for session_id in set(_session_hashes) | set(_session_locks):
+        if session_id not in remaining:
+            _forget_session(session_id)
+    return purged
@@ -0,0 +1,63 @@
+import re
+from models import Document, DocumentTag, db
+
+MAX_TAG_LENGTH = 50
+
+def normalize_tag(name):
+    """Normalize a tag name: trimmed, lowercase, single spaces"""
+    return re.sub(r'\s+', ' ', str(name)).strip().lower()
+
+def parse_tags(tags):
+    """Parse tags from a comma-separated string or a list.
+
+    Returns unique normalized names in their original order; empty and
+    over-long names are dropped.
+    """
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    elif not isinstance(tags, (list, tuple)):
+        return []
+    
+    tag_list = []
+    for tag in tags:
+        tag_name = normalize_tag(tag)
+        if tag_name and len(tag_name) <= MAX_TAG_LENGTH and tag_name not in tag_list:
+            tag_list.append(tag_name)
+    return tag_list
+
+def parse_tag_filter(value):
+    """Parse the tags of a ?tags= filter.
+    
+    Unlike parse_tags() nothing is dropped silently: a tag no document
+    can carry, or a value naming no tag at all, raises ValueError rather
+    than leaving the listing unfiltered. Returns [] for an empty value.
+    """
+    if not value.strip():
+        return []
+    
+    tag_names = [normalize_tag(tag) for tag in value.split(',')]
+    if any(len(tag_name) > MAX_TAG_LENGTH for tag_name in tag_names):
+        raise ValueError(f'tags must be at most {MAX_TAG_LENGTH} characters each')
+    
+    tag_names = parse_tags(tag_names)
+    if not tag_names:
+        raise ValueError('tags must name at least one tag')
+    return tag_names
+
+def apply_tag_filter(query, tag_names, match_all=True):
+    """Restrict a document query to documents carrying the given tags.
+
+    The matching document ids come from the (tag_name, document_id) index,
+    so the cost grows with the number of tagged documents rather than the
+    size of document_tags. With ``match_all`` every tag must be present,
+    otherwise any one of them is enough.
+    """
+    matching_ids = db.select(DocumentTag.document_id).where(DocumentTag.tag_name.in_(tag_names))
+    
+    if match_all and len(tag_names) > 1:
+        # Tags are unique per document, so a full match has one row per tag
+        matching_ids = matching_ids.group_by(DocumentTag.document_id).having(
+            db.func.count(DocumentTag.id) == len(tag_names)
+        )
+    
+    return query.filter(Document.id.in_(matching_ids))
@@ -0,0 +1,39 @@
+import io
+import os
+import sys
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on an empty SQLite database, running jobs in the test's thread"""
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'documents.db'}")
+    monkeypatch.setattr(Config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(Config, 'AUTO_MIGRATE', True)
+    monkeypatch.setattr(Config, 'JOB_THREADS', 0)
+    
+    import cache
+    monkeypatch.setattr(cache, '_backend', None)
+    
+    from app import create_app
+    return create_app()
+
+@pytest.fixture
+def client(app):
+    """A test client authenticated as a freshly registered admin"""
+    client = app.test_client()
+    response = client.post('/api/auth/register', json={
+        'username': 'admin', 'email': 'admin@example.com', 'password': 'password123'
+    })
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {response.get_json()['access_token']}"
+    return client
+
+def upload(client, content, filename='file.txt', **form):
+    """Upload a document through the single-file endpoint"""
+    return client.post('/api/documents/upload', content_type='multipart/form-data', data={
+        'file': (io.BytesIO(content), filename), **form
+    })
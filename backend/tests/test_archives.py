@@ -0,0 +1,47 @@
+import io
+import os
+import zipfile
+import pytest
+
+resource = pytest.importorskip('resource')
+
+def make_archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+@pytest.fixture
+def low_file_limit():
+    # Leave far fewer descriptors free than the archive has members
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    open_now = len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else 64
+    resource.setrlimit(resource.RLIMIT_NOFILE, (open_now + 100, hard))
+    yield
+    resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+def test_import_archive_with_many_members(client, low_file_limit):
+    members = {f'notes/note {number}.txt': f'note {number}' for number in range(300)}
+    response = client.post('/api/documents/import-archive', content_type='multipart/form-data', data={
+        'archive': (make_archive(members), 'notes.zip')
+    })
+    
+    assert response.status_code == 201, response.get_json()
+    assert client.get('/api/documents').get_json()['pagination']['total'] == 300
+
+def test_import_archive_tags_directories_not_used_as_category(app, client):
+    from models import Category
+    # Both are among the default categories
+    with app.app_context():
+        personal = Category.query.filter_by(name='Personal').one().id
+        assert Category.query.filter_by(name='Work').count() == 1
+    
+    response = client.post('/api/documents/import-archive', content_type='multipart/form-data', data={
+        'archive': (make_archive({'Personal/Work/d.txt': 'd'}), 'd.zip')
+    })
+    document = response.get_json()['results'][0]['document']
+    
+    assert document['category_id'] == personal
+    assert document['tags'] == ['work']
@@ -0,0 +1,16 @@
+import cache
+from conftest import upload
+
+def test_etag_does_not_survive_a_cache_backend_restart(client, monkeypatch):
+    upload(client, b'first')
+    first = client.get('/api/documents')
+    etag = first.headers['ETag']
+    assert client.get('/api/documents', headers={'If-None-Match': etag}).status_code == 304
+    
+    # A restarted process (or another worker) starts its counters from zero
+    monkeypatch.setattr(cache, '_backend', None)
+    upload(client, b'second')
+    
+    response = client.get('/api/documents', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['pagination']['total'] == 2
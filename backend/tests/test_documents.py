@@ -0,0 +1,71 @@
+import io
+import json
+import pytest
+from conftest import upload
+
+@pytest.mark.parametrize('params', [
+    {'uploaded_after': 'yesterday'},
+    {'uploaded_before': '2024-13-01'},
+    {'min_size': 'abc'},
+    {'max_size': '-1'},
+])
+def test_malformed_range_filters_are_rejected(client, params):
+    response = client.get('/api/documents', query_string=params)
+    assert response.status_code == 400
+    assert next(iter(params)) in response.get_json()['error']
+    
+    assert client.get('/api/documents/export', query_string=params).status_code == 400
+
+def test_range_filters_are_counted_not_taken_from_counters(client):
+    upload(client, b'small')
+    upload(client, b'a much larger file')
+    
+    for count in ('exact', 'estimate'):
+        response = client.get('/api/documents', query_string={'min_size': 10, 'count': count})
+        pagination = response.get_json()['pagination']
+        assert len(response.get_json()['documents']) == 1
+        assert pagination['total'] == 1
+
+def test_fuzzy_search_reports_truncated_candidates(client, monkeypatch):
+    from config import Config
+    for number in range(3):
+        upload(client, f'report {number}'.encode(), filename=f'quarterly report {number}.txt')
+    
+    params = {'search': 'quartrly report', 'fuzzy': 1}
+    pagination = client.get('/api/documents', query_string=params).get_json()['pagination']
+    assert pagination['total'] == 3
+    assert pagination['truncated'] is False
+    
+    # A different per_page keeps the cached response out of the way
+    monkeypatch.setattr(Config, 'FUZZY_SEARCH_CANDIDATES', 2)
+    pagination = client.get('/api/documents', query_string={**params, 'per_page': 5}).get_json()['pagination']
+    assert pagination['total'] == 2
+    assert pagination['truncated'] is True
+    
+    response = client.get('/api/documents/export', query_string=params)
+    assert response.headers['X-Results-Truncated'] == 'true'
+
+def batch_upload(client, metadata):
+    return client.post('/api/documents/batch-upload', content_type='multipart/form-data', data={
+        'files': [(io.BytesIO(b'batch file'), 'batch.txt')],
+        'metadata': json.dumps(metadata)
+    })
+
+@pytest.mark.parametrize('category_id', [[1], {'id': 1}, '1', True])
+def test_batch_upload_rejects_malformed_category_ids(client, category_id):
+    response = batch_upload(client, [{'category_id': category_id}])
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'category_id must be an integer'
+
+def test_batch_upload_treats_null_description_as_empty(client):
+    response = batch_upload(client, [{'title': None, 'description': None}])
+    document = response.get_json()['results'][0]['document']
+    assert document['title'] == 'batch'
+    assert document['description'] == ''
+
+@pytest.mark.parametrize('tags', [',', ' , ', 'x' * 51, 'work,' + 'x' * 51])
+def test_tag_filters_naming_no_possible_tag_are_rejected(client, tags):
+    upload(client, b'tagged', tags='work')
+    assert client.get('/api/documents', query_string={'tags': tags}).status_code == 400
+    assert client.get('/api/documents', query_string={'tags': 'nope'}).get_json()['pagination']['total'] == 0
+    assert client.get('/api/documents', query_string={'tags': 'work'}).get_json()['pagination']['total'] == 1
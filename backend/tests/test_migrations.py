@@ -0,0 +1,88 @@
+import sqlite3
+import pytest
+from config import Config
+
+# The schema created by the first release, before any migration existed.
+# Kept as plain DDL so the check never depends on the current models.
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, email VARCHAR(120) NOT NULL,
+    password_hash VARCHAR(255) NOT NULL, role VARCHAR(20), created_at DATETIME,
+    PRIMARY KEY (id), UNIQUE (username), UNIQUE (email)
+);
+CREATE TABLE categories (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, description TEXT, color VARCHAR(7),
+    created_at DATETIME, PRIMARY KEY (id), UNIQUE (name)
+);
+CREATE TABLE documents (
+    id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, filename VARCHAR(255) NOT NULL,
+    filepath VARCHAR(500) NOT NULL, file_size INTEGER NOT NULL, file_type VARCHAR(50) NOT NULL,
+    description TEXT, upload_date DATETIME, user_id INTEGER NOT NULL, category_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(category_id) REFERENCES categories (id)
+);
+CREATE TABLE document_tags (
+    id INTEGER NOT NULL, document_id INTEGER NOT NULL, tag_name VARCHAR(50) NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(document_id) REFERENCES documents (id)
+);
+"""
+
+@pytest.fixture
+def baseline_database(tmp_path, monkeypatch):
+    """A database and upload folder as the first release left them"""
+    upload_folder = tmp_path / 'uploads'
+    upload_folder.mkdir()
+    
+    files = []
+    for name, content in [('a.txt', b'hello'), ('b.txt', b'hello'), ('c.pdf', b'%PDF-1.4 c')]:
+        path = upload_folder / f'old-{name}'
+        path.write_bytes(content)
+        files.append((name, str(path), len(content)))
+    
+    connection = sqlite3.connect(tmp_path / 'documents.db')
+    connection.executescript(BASELINE_SCHEMA)
+    connection.execute(
+        "INSERT INTO users VALUES (1, 'admin', 'admin@example.com', 'x', 'admin', '2024-01-01 00:00:00')"
+    )
+    for document_id, (name, path, size) in enumerate(files, start=1):
+        connection.execute(
+            'INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, NULL, ?, 1, NULL)',
+            (document_id, name, name, path, size, name.rsplit('.', 1)[1], '2024-01-01 00:00:00')
+        )
+        connection.execute('INSERT INTO document_tags VALUES (?, ?, ?)', (document_id, document_id, ' Old  Tag '))
+    connection.commit()
+    connection.close()
+    
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'documents.db'}")
+    monkeypatch.setattr(Config, 'UPLOAD_FOLDER', str(upload_folder))
+    monkeypatch.setattr(Config, 'AUTO_MIGRATE', True)
+    monkeypatch.setattr(Config, 'JOB_THREADS', 0)
+    return upload_folder
+
+def test_upgrade_from_baseline(baseline_database):
+    from app import create_app
+    from migrations import applied_versions, MIGRATIONS
+    from models import Blob, Document, DocumentTag, User, db
+    from storage import blob_path
+    
+    # create_app() applies every pending migration on startup
+    app = create_app()
+    
+    with app.app_context():
+        assert applied_versions(db.engine) == {version for version, _, _ in MIGRATIONS}
+        
+        documents = Document.query.order_by(Document.id).all()
+        assert [document.filepath == blob_path(document.sha256) for document in documents] == [True] * 3
+        assert [document.mime_type for document in documents] == ['text/plain', 'text/plain', 'application/pdf']
+        
+        # The two identical files now share one blob
+        assert {blob.sha256: blob.ref_count for blob in Blob.query} == {
+            documents[0].sha256: 2, documents[2].sha256: 1
+        }
+        assert not any(baseline_database.glob('old-*'))
+        
+        assert {tag.tag_name for tag in DocumentTag.query} == {'old tag'}
+        assert db.session.get(User, 1).documents_count == 3
+    
+    # A restart finds nothing left to apply
+    create_app()
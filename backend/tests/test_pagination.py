@@ -0,0 +1,16 @@
+from sqlalchemy.dialects import postgresql
+from models import Document
+from pagination import _explain_statement
+from tags import apply_tag_filter
+
+def test_explain_statement_expands_in_lists(app):
+    with app.app_context():
+        query = apply_tag_filter(Document.query, ['a', 'b'], match_all=False)
+        query = query.filter(Document.id.in_([1, 2, 3])).order_by(Document.id)
+        sql, params = _explain_statement(query, postgresql.psycopg2.dialect())
+    
+    assert sql.startswith('EXPLAIN (FORMAT JSON) SELECT')
+    assert 'POSTCOMPILE' not in sql
+    assert sorted(params.values(), key=str) == [1, 2, 3, 'a', 'b']
+    for name in params:
+        assert f'%({name})s' in sql
@@ -0,0 +1,51 @@
+import io
+import os
+import threading
+from models import Document, db
+from storage import acquire_blob, blob_path, copy_upload, release_document_file
+from conftest import upload
+
+def test_blob_is_kept_until_the_delete_commits(app, client, monkeypatch):
+    first = upload(client, b'shared contents').get_json()['document']['id']
+    second = upload(client, b'shared contents').get_json()['document']['id']
+    with app.app_context():
+        path = blob_path(db.session.get(Document, first).sha256)
+    
+    def fail_commit():
+        raise RuntimeError('database is gone')
+    
+    assert client.delete(f'/api/documents/{first}').status_code == 200
+    assert os.path.exists(path)
+    
+    # Dropping the last reference fails to commit; the file must survive
+    with monkeypatch.context() as patch:
+        patch.setattr(db.session, 'commit', fail_commit)
+        assert client.delete(f'/api/documents/{second}').status_code == 500
+    assert os.path.exists(path)
+    
+    assert client.delete(f'/api/documents/{second}').status_code == 200
+    assert not os.path.exists(path)
+
+def test_blob_placed_by_an_uncommitted_upload_survives_a_release(app, client):
+    document_id = upload(client, b'shared contents').get_json()['document']['id']
+    with app.app_context():
+        document = db.session.get(Document, document_id)
+        remove_files = release_document_file(document)
+        db.session.delete(document)
+        db.session.commit()
+    
+    with app.app_context():
+        # Another request stores the same contents and hasn't committed yet
+        pending = copy_upload(io.BytesIO(b'shared contents'), 'again.txt')
+        path = acquire_blob(pending)
+        
+        def finish_release():
+            with app.app_context():
+                remove_files()
+        thread = threading.Thread(target=finish_release)
+        thread.start()
+        thread.join()
+        
+        assert os.path.exists(path)
+        db.session.commit()
+    assert os.path.exists(path)
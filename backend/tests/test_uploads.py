@@ -0,0 +1,39 @@
+import shutil
+import storage
+from storage import ChunkedUpload, purge_expired_uploads
+
+def start_upload(client, content):
+    response = client.post('/api/uploads', json={'filename': 'notes.txt', 'size': len(content)})
+    session_id = response.get_json()['upload']['id']
+    client.put(f'/api/uploads/{session_id}?offset=0', data=content)
+    return session_id
+
+def test_upload_is_completed_only_once(app, client):
+    session_id = start_upload(client, b'hello world')
+    
+    # Another request has claimed the session and is creating the document
+    with app.app_context():
+        claimed = ChunkedUpload.load(session_id).complete()
+    
+    assert client.post(f'/api/uploads/{session_id}/complete').status_code == 409
+    assert client.put(f'/api/uploads/{session_id}?offset=11', data=b'!').status_code == 409
+    assert client.get(f'/api/uploads/{session_id}').get_json()['upload']['completing'] is True
+    
+    # It failed and gave the session up; a retry goes through
+    with app.app_context():
+        claimed.release()
+    assert client.post(f'/api/uploads/{session_id}/complete').status_code == 201
+    assert client.post(f'/api/uploads/{session_id}/complete').status_code == 404
+    assert client.get('/api/documents').get_json()['pagination']['total'] == 1
+
+def test_purge_forgets_sessions_removed_elsewhere(app, client):
+    session_id = start_upload(client, b'partial')
+    assert session_id in storage._session_hashes
+    
+    with app.app_context():
+        # e.g. cancelled through another worker process
+        shutil.rmtree(ChunkedUpload.load(session_id).directory)
+        purge_expired_uploads()
+    
+    assert session_id not in storage._session_hashes
+    assert session_id not in storage._session_locks
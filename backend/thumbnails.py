@@ -0,0 +1,75 @@
+import os
+import uuid
+from PIL import Image, ImageOps
+from config import Config
+from models import Document
+from storage import blob_path
+from jobs import job_handler
+
+# File types thumbnails are made for
+THUMBNAIL_TYPES = {'png', 'jpg', 'jpeg', 'gif'}
+
+def thumbnail_path(sha256, size):
+    """Location of a blob's thumbnail, stored next to the blob itself.
+    
+    Named after the blob, so storage.remove_blob_files() deletes it too.
+    """
+    return f'{blob_path(sha256)}.{size}.jpg'
+
+def has_thumbnails(document):
+    """True if thumbnails can be made for a document's file"""
+    return document.file_type in THUMBNAIL_TYPES and bool(document.sha256)
+
+def _flatten(image):
+    # JPEG has no alpha channel or palette; composite onto white
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+def generate_thumbnails(path, sha256, sizes=None):
+    """Write the thumbnails of an image, largest first.
+    
+    The file is decoded once; JPEGs are decoded at reduced scale where
+    possible. Each thumbnail is written to a temporary name and renamed
+    into place, so readers never see a partial file.
+    """
+    sizes = sizes or Config.THUMBNAIL_SIZES
+    ordered = sorted(sizes, key=lambda name: Config.THUMBNAIL_SIZES[name], reverse=True)
+    largest = Config.THUMBNAIL_SIZES[ordered[0]]
+    
+    with Image.open(path) as image:
+        image.draft('RGB', (largest, largest))
+        # Only the first frame of an animated GIF is used
+        image = ImageOps.exif_transpose(image)
+        image = _flatten(image)
+        
+        for name in ordered:
+            edge = Config.THUMBNAIL_SIZES[name]
+            image.thumbnail((edge, edge), Image.LANCZOS)
+            
+            target = thumbnail_path(sha256, name)
+            temporary = f'{target}.{uuid.uuid4().hex}.tmp'
+            image.save(temporary, 'JPEG', quality=Config.THUMBNAIL_QUALITY, optimize=True)
+            os.replace(temporary, target)
+
+def ensure_thumbnail(document, size):
+    """Return the path of a document's thumbnail, generating it if missing"""
+    path = thumbnail_path(document.sha256, size)
+    if not os.path.exists(path):
+        generate_thumbnails(document.filepath, document.sha256, [size])
+    return path
+
+@job_handler('thumbnails', file_types=THUMBNAIL_TYPES)
+def thumbnails_job(job):
+    document = Document.query.get(job.document_id)
+    if document is None or not has_thumbnails(document):
+        return
+    
+    # Documents sharing a blob share its thumbnails
+    missing = [
+        size for size in Config.THUMBNAIL_SIZES
+        if not os.path.exists(thumbnail_path(document.sha256, size))
+    ]
+    if missing:
+        generate_thumbnails(document.filepath, document.sha256, missing)